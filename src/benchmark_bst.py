@@ -0,0 +1,237 @@
+"""Benchmark the BST from the solution to the BST try it yourself.
+
+Run this file directly; nothing here runs on import.  By default it
+compares every backend on every insertion order at small sizes:
+
+    python benchmark_bst.py
+    python benchmark_bst.py --sizes 1000 100000 --orders random zigzag --backends BTree
+    python benchmark_bst.py --batches
+"""
+
+import argparse
+import random
+import time
+import timeit
+import tracemalloc
+
+from tryit_bst_with_hashes_solution import BST, BTree, CompactBST, ConcurrentBST, IndexedBST
+
+
+# Functions that give the keys 0 to n - 1 in the order they are inserted
+ORDERS = {
+    'random': lambda n, rng: rng.sample(range(n), n),
+    'ascending': lambda n, rng: list(range(n)),
+    'descending': lambda n, rng: list(range(n - 1, -1, -1)),
+    # Alternate between the smallest and the largest key left
+    'zigzag': lambda n, rng: [n - 1 - i // 2 if i % 2 else i // 2 for i in range(n)],
+}
+
+# Functions that make an empty tree of each backend
+BACKENDS = {
+    'BST': BST,
+    'BST balanced': lambda: BST(balanced=True),
+    'CompactBST': CompactBST,
+    'BTree': BTree,
+    'IndexedBST': IndexedBST,
+    'ConcurrentBST': ConcurrentBST,
+}
+
+# Operations measured in operations per second
+RATES = ('insert', 'contains', 'iterate', 'height', 'remove')
+
+# Backends that do not balance themselves, so sorted keys make them O(n) deep
+UNBALANCED = {'BST', 'CompactBST'}
+
+
+def best_time(function, repeat=3):
+    """Best wall clock time in seconds of several runs of 'function'.
+    """
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def benchmark_batches(tree_size=100_000, ratios=(0.001, 0.01, 0.1, 0.5, 1.0, 4.0),
+                      balanced=False):
+    """Compare the batch methods against one call per value.
+
+    A fresh random tree is built for every run so each measures the
+    same amount of work.  Batches are random keys from the same range
+    as the tree, so about half of them are already present.
+    """
+    rng = random.Random(212)
+    tree_keys = rng.sample(range(tree_size * 2), tree_size)
+    print(f'Batches against a tree of {tree_size:,} keys (balanced={balanced})')
+    print(f'{"batch":>10} {"operation":>10} {"per key":>10} {"batch":>10} {"speedup":>8}')
+    for ratio in ratios:
+        batch = [rng.randrange(tree_size * 2) for _ in range(max(1, int(tree_size * ratio)))]
+
+        def fresh_tree():
+            return BST.from_iterable(tree_keys, balanced=balanced)
+
+        def insert_loop(tree):
+            for value in batch:
+                tree.insert(value)
+
+        def remove_loop(tree):
+            for value in batch:
+                tree.remove(value)
+
+        def contains_loop(tree):
+            return [value in tree for value in batch]
+
+        pairs = (
+            ('insert', insert_loop, BST.insert_many),
+            ('remove', remove_loop, BST.remove_many),
+            ('contains', contains_loop, BST.contains_many),
+        )
+        for name, loop, batched in pairs:
+            loop_time = min(_timed_on_fresh_tree(fresh_tree, loop) for _ in range(3))
+            batch_time = min(_timed_on_fresh_tree(fresh_tree,
+                                                  lambda tree: batched(tree, batch))
+                             for _ in range(3))
+            print(f'{len(batch):>10,} {name:>10} {loop_time:>9.4f}s {batch_time:>9.4f}s '
+                  f'{loop_time / batch_time:>7.2f}x')
+
+
+def _timed_on_fresh_tree(fresh_tree, operation):
+    """Time 'operation' on a newly built tree, leaving the build out of the timing.
+    """
+    tree = fresh_tree()
+    return best_time(lambda: operation(tree), repeat=1)
+
+
+def benchmark_backends(sizes=(1_000, 10_000), orders=tuple(ORDERS), backends=tuple(BACKENDS),
+                       repeat=1, memory=True, max_degenerate=2_000):
+    """Measure every backend on every insertion order and size side by side.
+
+    For each run the keys are inserted one at a time, the height is
+    asked for, all keys are looked up in a random order, traversed and
+    removed again in that random order, all on the tree as the
+    insertion order built it.  (Removing in insertion order would take
+    the root of a sorted chain every time and hide how deep it is.)  Rebalancing is timed on a second
+    tree built the same way.  Rates are the best of 'repeat' runs.  height() is called 10^6 / n
+    times (at least once), as some backends walk the whole tree for it.
+    The peak memory of building the tree is measured with tracemalloc
+    in a separate build, as tracing slows everything down.
+
+    An unbalanced backend given sorted keys turns into a linked list
+    and takes O(n^2), so those runs are skipped above 'max_degenerate'
+    keys.
+    """
+    print(f'{"backend":>14} {"order":>10} {"keys":>10} {"insert/s":>10} {"contains/s":>10} '
+          f'{"iterate/s":>10} {"height/s":>10} {"remove/s":>10} {"rebalance":>10} {"height":>7} '
+          f'{"peak MB":>8}')
+    for size in sizes:
+        for order in orders:
+            rng = random.Random(212)
+            keys = ORDERS[order](size, rng)
+            lookups = rng.sample(keys, len(keys))
+            for backend in backends:
+                if backend in UNBALANCED and order != 'random' and size > max_degenerate:
+                    print(f'{backend:>14} {order:>10} {size:>10,} skipped (degenerate)')
+                    continue
+                runs = [_measure(BACKENDS[backend], keys, lookups) for _ in range(repeat)]
+                result = {name: max(run[name] for run in runs) for name in RATES}
+                result['levels'] = runs[0]['levels']
+                result['rebalance'] = runs[0]['rebalance'] and \
+                    min(run['rebalance'] for run in runs)
+                peak = f'{_peak_memory(BACKENDS[backend], keys) / 2 ** 20:>8.1f}' if memory else \
+                    f'{"-":>8}'
+                rebalance = '-' if result['rebalance'] is None else f'{result["rebalance"]:.4f}s'
+                print(f'{backend:>14} {order:>10} {size:>10,} {result["insert"]:>10,.0f} '
+                      f'{result["contains"]:>10,.0f} {result["iterate"]:>10,.0f} '
+                      f'{result["height"]:>10,.0f} {result["remove"]:>10,.0f} {rebalance:>10} '
+                      f'{result["levels"]:>7} {peak}')
+
+
+def _measure(factory, keys, lookups):
+    """One run of every operation on a new tree.
+
+    Returns:
+        dict: operations per second for each operation, the seconds a
+        rebalance took (None if the backend cannot rebalance) and the
+        height after inserting (as 'levels')
+    """
+    tree = factory()
+    count = max(len(keys), 1)
+    result = {}
+
+    start = time.perf_counter()
+    for key in keys:
+        tree.insert(key)
+    result['insert'] = count / _elapsed(start)
+
+    calls = max(1, min(count, 1_000_000 // count))
+    start = time.perf_counter()
+    for _ in range(calls):
+        result['levels'] = tree.height()
+    result['height'] = calls / _elapsed(start)
+
+    start = time.perf_counter()
+    for key in lookups:
+        key in tree
+    result['contains'] = count / _elapsed(start)
+
+    start = time.perf_counter()
+    for _ in tree:
+        pass
+    result['iterate'] = count / _elapsed(start)
+
+    start = time.perf_counter()
+    for key in lookups:
+        tree.remove(key)
+    result['remove'] = count / _elapsed(start)
+
+    result['rebalance'] = None
+    if hasattr(tree, 'rebalance_tree'):
+        # Rebalancing changes the shape, so it gets a tree of its own
+        tree = factory()
+        for key in keys:
+            tree.insert(key)
+        start = time.perf_counter()
+        tree.rebalance_tree()
+        result['rebalance'] = _elapsed(start)
+    return result
+
+
+def _elapsed(start):
+    # Never zero, so a rate can always be worked out
+    return max(time.perf_counter() - start, 1e-9)
+
+
+def _peak_memory(factory, keys):
+    """Peak bytes allocated while building a tree of 'keys'.
+    """
+    tracemalloc.start()
+    try:
+        tree = factory()
+        for key in keys:
+            tree.insert(key)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the BST backends.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000],
+                        help='numbers of keys to run with (10^3 to 10^7)')
+    parser.add_argument('--orders', nargs='+', choices=list(ORDERS), default=list(ORDERS))
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=1, help='runs to take the best of')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='skip the (slow) tracemalloc build')
+    parser.add_argument('--max-degenerate', type=int, default=2_000,
+                        help='largest sorted run for the unbalanced backends')
+    parser.add_argument('--batches', action='store_true',
+                        help='compare the batch methods against one call per value instead')
+    args = parser.parse_args()
+    if args.batches:
+        benchmark_batches()
+        benchmark_batches(balanced=True)
+        return
+    benchmark_backends(args.sizes, args.orders, args.backends, args.repeat, args.memory,
+                       args.max_degenerate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark the queues from the solution to the queues try it yourself.
+
+Run this file directly; nothing here runs on import.
+
+    python benchmark_queues.py
+    python benchmark_queues.py --producers 4 --consumers 4 --items 200000
+    python benchmark_queues.py --tiered --tiers 4 64 512
+"""
+
+import argparse
+import queue
+import threading
+import time
+
+from tryit_queues_solution import BlockingQueue, TieredQueue
+
+
+# Functions that make an empty queue of each kind, given a maxsize
+BLOCKING_QUEUES = {
+    'BlockingQueue': lambda maxsize: BlockingQueue(maxsize=maxsize),
+    'queue.Queue': lambda maxsize: queue.Queue(maxsize=maxsize),
+}
+
+
+def benchmark_blocking(producers=(1, 2, 4), consumers=(1, 2, 4), items=100_000,
+                       maxsizes=(0, 100), repeat=3):
+    """Compare multi-producer, multi-consumer throughput against queue.Queue.
+
+    Each run starts the consumers, has the producers put 'items'
+    values between them, and stops once every value has been taken
+    out.  Throughput is the best of 'repeat' runs in values per second.
+    """
+    print(f'{"queue":>14} {"producers":>9} {"consumers":>9} {"maxsize":>8} {"items/s":>12}')
+    for maxsize in maxsizes:
+        for producer_count in producers:
+            for consumer_count in consumers:
+                for name, factory in BLOCKING_QUEUES.items():
+                    best = min(_producer_consumer_run(factory(maxsize), producer_count,
+                                                      consumer_count, items)
+                               for _ in range(repeat))
+                    print(f'{name:>14} {producer_count:>9} {consumer_count:>9} {maxsize:>8} '
+                          f'{items / best:>12,.0f}')
+
+
+def _producer_consumer_run(shared, producer_count, consumer_count, items):
+    """Seconds for the producers to hand 'items' values to the consumers.
+    """
+    # Split the items as evenly as possible between the producers
+    shares = [items // producer_count + (index < items % producer_count)
+              for index in range(producer_count)]
+
+    def produce(share):
+        for number in range(share):
+            shared.put(number)
+
+    def consume():
+        while shared.get() is not None:
+            pass
+
+    consumer_threads = [threading.Thread(target=consume) for _ in range(consumer_count)]
+    producer_threads = [threading.Thread(target=produce, args=(share,)) for share in shares]
+    start = time.perf_counter()
+    for thread in consumer_threads + producer_threads:
+        thread.start()
+    for thread in producer_threads:
+        thread.join()
+    # One stop marker per consumer, queued behind every real value
+    for _ in consumer_threads:
+        shared.put(None)
+    for thread in consumer_threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+class ScanningTieredQueue(TieredQueue):
+    """TieredQueue that looks through the tiers on every call, for comparison.
+
+    This is how the original four-tier queue worked: len() adds up every
+    tier, empty calls len(), and dequeue checks each tier's empty in turn.
+    """
+
+    def dequeue(self):
+        for tier in self.tiers:
+            if not tier.empty:
+                return tier.dequeue()
+        return None
+
+    def __len__(self):
+        return sum(len(tier) for tier in self.tiers)
+
+    @property
+    def empty(self):
+        return self.__len__() == 0
+
+
+def benchmark_tiered(tiers=(4, 16, 64, 512), items=100_000, repeat=3):
+    """Compare draining a TieredQueue against looking through the tiers each time.
+
+    The customers are spread evenly over the tiers, then taken out one
+    at a time in a 'while not empty' loop, as a consumer would.
+    Throughput is the best of 'repeat' runs in dequeues per second.
+    """
+    print(f'{"tiers":>6} {"scanning/s":>12} {"counted/s":>12} {"speedup":>8}')
+    for tier_count in tiers:
+        rates = []
+        for kind in (ScanningTieredQueue, TieredQueue):
+            best = min(_drain_run(kind(tier_count), tier_count, items) for _ in range(repeat))
+            rates.append(items / best)
+        print(f'{tier_count:>6} {rates[0]:>12,.0f} {rates[1]:>12,.0f} '
+              f'{rates[1] / rates[0]:>7.2f}x')
+
+
+def _drain_run(tiered, tier_count, items):
+    """Seconds to dequeue 'items' customers spread over every tier.
+    """
+    for number in range(items):
+        tiered.enqueue(number, number % tier_count + 1)
+    start = time.perf_counter()
+    while not tiered.empty:
+        tiered.dequeue()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the queues.')
+    parser.add_argument('--producers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--consumers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--items', type=int, default=100_000,
+                        help='values passed through the queue in each run')
+    parser.add_argument('--maxsizes', type=int, nargs='+', default=[0, 100],
+                        help='queue capacities to run with (0 for no limit)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs to take the best of')
+    parser.add_argument('--tiered', action='store_true',
+                        help='time draining a TieredQueue instead')
+    parser.add_argument('--tiers', type=int, nargs='+', default=[4, 16, 64, 512],
+                        help='numbers of tiers to run with --tiered')
+    args = parser.parse_args()
+    if args.tiered:
+        benchmark_tiered(args.tiers, args.items, args.repeat)
+        return
+    benchmark_blocking(args.producers, args.consumers, args.items, args.maxsizes, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
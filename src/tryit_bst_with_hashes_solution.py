@@ -1,126 +1,366 @@
 """Demonstrate the use and balancing of a BST.
 """
 
+import bisect
+import itertools
+import math
+import mmap as mmap_module
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    # Only used to speed up batches of lookups in a FrozenBST
+    numpy = None
+
+# Snapshot files written by BST.save: magic, flags, value count, then the values
+SNAPSHOT_HEADER = struct.Struct('<4sB3xQ')
+SNAPSHOT_MAGIC = b'BST1'
+SNAPSHOT_ALLOW_DUPS = 1
+SNAPSHOT_BALANCED = 2
+
+
 class BST:
     """Binary Search Tree Class
 
     Almost all of the methods as seen in the reading are accessible in this class.
     """
 
+    # Batches at least 1/MERGE_RATIO the size of the tree are merged with
+    # the whole tree instead of being handled one value at a time.  Below
+    # that, walking the batch down the tree one value at a time is faster
+    # (see benchmark_bst.py).
+    MERGE_RATIO = 2
+
     class Node:
         """The fundamental object that makes up parts of the tree.
+
+        __slots__ removes the per-node __dict__, which is most of
+        the memory used by a node.
         """
 
-        def __init__(self, data):
+        __slots__ = ('data', 'key', 'less_than', 'greater_than', 'height', 'size', 'count')
+
+        def __init__(self, data, key=None):
             self.data = data
+            # What the tree compares: the data itself unless a key function
+            # was given, in which case the key is worked out once and kept
+            self.key = data if key is None else key
             self.less_than = None
             self.greater_than = None
+            # Height of the sub-tree starting at this node
+            self.height = 1
+            # Number of values in the sub-tree starting at this node
+            self.size = 1
+            # Number of times this value was inserted (duplicates share a node)
+            self.count = 1
 
-    def __init__(self, allow_dups=False):
+    # Inserts make their nodes through this, so a subclass can count them
+    _new_node = Node
+
+    def __init__(self, allow_dups=False, balanced=False, key=None):
+        """Create an empty BST.
+
+        Args:
+            allow_dups (bool): allow the same value to be inserted more than
+                once; copies are counted by the node holding the value
+            balanced (bool): keep the tree balanced as an AVL tree so that
+                insert, remove and lookups stay O(log n) for any insert order
+            key (function): order values by key(value) instead of the values
+                themselves, like sorted().  The key is computed once per
+                value and kept in its node.  Values with equal keys count
+                as the same value, and every method that takes a value
+                compares it by its key.
+
+        Raises:
+            ValueError: if both 'allow_dups' and 'key' are given, as
+                values with equal keys would be merged into one count
+        """
+        if allow_dups and key is not None:
+            raise ValueError('allow_dups cannot be used with a key function')
         self._size = 0
         self.root = None
         self.allow_dups = allow_dups
+        self.balanced = balanced
+        self.key = key
+
+    def _key_of(self, value):
+        """The key 'value' is compared by.
+        """
+        return value if self.key is None else self.key(value)
+
+    @classmethod
+    def from_sorted(cls, iterable, allow_dups=False, balanced=False, key=None):
+        """Build a tree of minimal height from values in ascending order.
+
+        The values are streamed straight into a vine of new nodes, which
+        is then folded into a tree, so this is O(n) and never holds a
+        second copy of the input.
+
+        Args:
+            iterable (iterable): values in ascending order
+            allow_dups (bool): keep repeated values instead of skipping them
+            balanced (bool): keep the tree balanced on later changes
+            key (function): order values by key(value)
+
+        Raises:
+            ValueError: if the values are not in ascending order
+        """
+        tree = cls(allow_dups=allow_dups, balanced=balanced, key=key)
+        head, count = tree._sorted_to_vine(iterable, allow_dups, key)
+        tree.root, _ = tree._vine_to_tree(head, count)
+        tree._size = tree._subtree_size(tree.root)
+        return tree
+
+    @staticmethod
+    def _sorted_to_vine(iterable, allow_dups, key=None):
+        """
+        Make a new node for every distinct value in ascending order (of
+        'key' if given) and link them into a vine along the "greater than"
+        side.  Repeated values are counted by their node if 'allow_dups'
+        is set.
+
+        Returns:
+            tuple: (smallest node of the vine, number of nodes)
+        """
+        head = None
+        tail = None
+        count = 0
+        for value in iterable:
+            value_key = value if key is None else key(value)
+            if tail is not None:
+                if value_key < tail.key:
+                    raise ValueError('from_sorted() requires values in ascending order')
+                if value_key == tail.key:
+                    if allow_dups:
+                        tail.count += 1
+                    continue
+            node = BST.Node(value, value_key)
+            if tail is None:
+                head = node
+            else:
+                tail.greater_than = node
+            tail = node
+            count += 1
+        return (head, count)
+
+    @classmethod
+    def from_iterable(cls, iterable, presorted=False, allow_dups=False, balanced=False,
+                      key=None):
+        """Build a tree of minimal height from any values.
+
+        Unsorted values are sorted first (O(n log n)); pass presorted=True
+        to skip that and stream them through from_sorted in O(n).
+        """
+        if not presorted:
+            iterable = sorted(iterable, key=key)
+        return cls.from_sorted(iterable, allow_dups=allow_dups, balanced=balanced, key=key)
 
-    # Make it so the size is correctly tracked!
     def insert(self, value):
         """Insert a value into the BST.
 
         Args:
             value (any comparable): value to insert to BST
         """
+        key = self._key_of(value)
         if self.root is None:
             self._size += 1
-            self.root = BST.Node(value)
+            self.root = self._new_node(value, key)
         else:
-            self._insert(value, self.root)
+            self._insert(value, key, self.root)
 
-    def _insert(self, data, node):
-        if data < node.data:
-            # The data belongs on the "less than" side.
-            if node.less_than is None:
-                # We found an empty spot
-                node.less_than = BST.Node(data)
-                self._size += 1
-            else:
-                # Need to keep looking. Call _insert
-                # recursively on the "less than" sub-tree.
-                self._insert(data, node.less_than)
-        elif data == node.data and not self.allow_dups:
-            # Early return prevents incrementing size
-            return
-        else:
-            # The data belongs on the "greater than" side.
-            # If duplicates are allowed, they will be put on this side.
-            if node.greater_than is None:
-                # We found an empty spot
-                node.greater_than = BST.Node(data)
+    def _insert(self, data, key, node):
+        """
+        Walk down from 'node' to the empty spot where 'data' (compared
+        by 'key') belongs.  The nodes passed on the way down are kept in
+        'path' so that a balanced tree can be repaired on the way back
+        up without recursion.
+        """
+        path = []
+        while True:
+            path.append(node)
+            if key < node.key:
+                # The data belongs on the "less than" side.
+                if node.less_than is None:
+                    # We found an empty spot
+                    node.less_than = self._new_node(data, key)
+                    break
+                node = node.less_than
+            elif key == node.key:
+                if not self.allow_dups:
+                    # Early return prevents incrementing size
+                    return
+                # Duplicates are counted by the node that already has the value
+                node.count += 1
                 self._size += 1
+                for node in path:
+                    node.size += 1
+                return
             else:
-                # Need to keep looking. Call _insert
-                # recursively on the "greater than" sub-tree.
-                self._insert(data, node.greater_than)
+                # The data belongs on the "greater than" side.
+                if node.greater_than is None:
+                    # We found an empty spot
+                    node.greater_than = self._new_node(data, key)
+                    break
+                node = node.greater_than
+        self._size += 1
+        for node in path:
+            node.size += 1
+        self._retrace(path)
 
     def remove(self, value):
         """Remove a node from the BST.
 
         Removal of a node will require cleanup, especially if
         that node has children.
+
+        Returns:
+            bool: True if the value was found and removed
         """
-        if self.root is None:
-            return
-        if self._size == 1:
-            self.root = None
-            self._size = 0
-            return
-        self._remove(value, self.root, None)
-        self._size -= 1
+        if self._remove(self._key_of(value), self.root, None):
+            self._size -= 1
+            return True
+        return False
 
+    def _remove(self, key, node, parent):
+        """
+        Find the value with 'key' starting at 'node' (whose parent is
+        'parent') and unlink it, all in a single walk down the tree.  A
+        balanced tree is repaired on the way back up using the nodes
+        passed on the way down.  The caller updates the tracked size.
 
-    def _remove(self, data, node, parent):
+        Returns:
+            bool: True if a value was removed
+        """
+        path = [] if parent is None else [parent]
+        while node is not None and node.key != key:
+            path.append(node)
+            if key < node.key:
+                node = node.less_than
+            else:
+                node = node.greater_than
         # Data not in tree
         if node is None:
+            return False
+        self._unlink(node, path)
+        return True
+
+    def _unlink(self, node, path):
+        """
+        Take one copy of the value in 'node' out of the tree, where
+        'path' holds the nodes above it from the root down.
+        """
+        for ancestor in path:
+            ancestor.size -= 1
+        # A duplicate only needs its count lowered
+        if node.count > 1:
+            node.count -= 1
+            node.size -= 1
             return
-        if data < node.data:
-            self._remove(data, node.less_than, node)
-        elif data > node.data:
-            self._remove(data, node.greater_than, node)
-        # Node is our target for removal
+        parent = path[-1] if path else None
+        # Removal of nodes with at most one child
+        if node.less_than is None:
+            self._disown_child(node, parent, node.greater_than)
+        elif node.greater_than is None:
+            self._disown_child(node, parent, node.less_than)
+        # Removal of nodes with two children
         else:
-            # Removal of leaf nodes
-            if node.less_than is None and node.greater_than is None:
-                self._disown_child(node, parent)
-            # Remove root node
-            elif node == self.root:
-                new_root, new_root_parent = self._get_new_root(node.less_than, parent)
-                self._disown_child(new_root, new_root_parent)
-                new_root.less_than = self.root.less_than
-                new_root.greater_than = self.root.greater_than
-                self.root = new_root
-            # Remove node with only one child
-            elif node.less_than is None:
-                self._disown_child(node, parent, node.greater_than)
-            elif node.greater_than is None:
-                self._disown_child(node, parent, node.less_than)
-            # Removal of nodes with two children
-            else:
-                replacement_node, replacement_parent_node = self._get_new_root(node.less_than, node)
-                self._disown_child(replacement_node, replacement_parent_node)
-                self._disown_child(node, parent, replacement_node)
-                replacement_node.less_than = node.less_than
-                replacement_node.greater_than = node.greater_than
+            # Keep walking down to the largest node on the "less than"
+            # side, which takes its place
+            node_index = len(path)
+            path.append(node)
+            replacement = node.less_than
+            if replacement.greater_than is not None:
+                while replacement.greater_than is not None:
+                    path.append(replacement)
+                    replacement = replacement.greater_than
+                # The nodes passed on the way to it no longer hold its values
+                for index in range(node_index + 1, len(path)):
+                    path[index].size -= replacement.count
+                # The replacement may still have smaller values hanging off of it
+                path[-1].greater_than = replacement.less_than
+                replacement.less_than = node.less_than
+            replacement.greater_than = node.greater_than
+            replacement.height = node.height
+            replacement.size = node.size - 1
+            self._disown_child(node, parent, replacement)
+            path[node_index] = replacement
+        self._retrace(path)
+
+    def pop_min(self):
+        """Remove and return the smallest value in O(log n) for a balanced tree.
+
+        Raises:
+            IndexError: if the BST is empty
+        """
+        return self._pop_end('less_than', 'greater_than')
 
-    @staticmethod
-    def _disown_child(node, parent, replacement=None):
-        if parent.less_than == node:
+    def pop_max(self):
+        """Remove and return the largest value in O(log n) for a balanced tree.
+
+        Raises:
+            IndexError: if the BST is empty
+        """
+        return self._pop_end('greater_than', 'less_than')
+
+    def _pop_end(self, side, other_side):
+        """
+        Walk down 'side' to the end of the tree and remove one copy of
+        the value there.  That node has nothing on 'side', so whatever
+        is on its 'other_side' takes its place.
+        """
+        if self.root is None:
+            raise IndexError('pop from an empty BST')
+        path = []
+        node = self.root
+        while getattr(node, side) is not None:
+            path.append(node)
+            node.size -= 1
+            node = getattr(node, side)
+        self._size -= 1
+        if node.count > 1:
+            node.count -= 1
+            node.size -= 1
+            return node.data
+        self._disown_child(node, path[-1] if path else None, getattr(node, other_side))
+        self._retrace(path)
+        return node.data
+
+    def _retrace(self, path):
+        """
+        Refresh the cached heights of the nodes in 'path' (ordered from
+        the root down) from the bottom up after an insertion or removal
+        below them, rebalancing them if the tree is balanced.  Stops as
+        soon as a sub-tree keeps its previous height, since nothing
+        above it can have changed.
+        """
+        for index in range(len(path) - 1, -1, -1):
+            node = path[index]
+            old_height = node.height
+            if self.balanced:
+                subtree = self._rebalance_subtree(node)
+                if subtree is not node:
+                    self._disown_child(node, path[index - 1] if index else None, subtree)
+            else:
+                self._update_height(node)
+                subtree = node
+            if subtree.height == old_height:
+                break
+
+    def _disown_child(self, node, parent, replacement=None):
+        if parent is None:
+            self.root = replacement
+        elif parent.less_than is node:
             parent.less_than = replacement
-        elif parent.greater_than == node:
+        else:
             parent.greater_than = replacement
 
-    def _get_new_root(self, node, parent):
-        if node.greater_than is None:
-            return (node, parent)
-        return self._get_new_root(node.greater_than, node)
-
     def __contains__(self, value):
         """
         Checks if data is in the BST.  This function
@@ -130,22 +370,201 @@ class BST:
             ("5 is in the bst")
 
         """
-        return self._contains(value, self.root)
+        return self._contains(self._key_of(value), self.root)
 
-    def _contains(self, value, node):
+    def _contains(self, key, node):
         """
-        This functon will search for a node that contains
-        'data'.  The current sub-tree being search is
+        This functon will search for a node whose value has
+        'key'.  The current sub-tree being search is
         represented by 'node'.  This function is intended
         to be called the first time by the __contains__ function.
         """
-        if node is None:
-            return False
-        if node.data == value:
-            return True
-        if value < node.data:
-            return self._contains(value, node.less_than)
-        return self._contains(value, node.greater_than)
+        while node is not None:
+            if node.key == key:
+                return True
+            if key < node.key:
+                node = node.less_than
+            else:
+                node = node.greater_than
+        return False
+
+    def insert_many(self, values):
+        """Insert a batch of values at once.
+
+        The batch is sorted first.  A batch that is large compared to
+        the tree is merged with the tree's nodes in order and the tree
+        rebuilt in O(n + m), which also leaves it balanced.  A smaller
+        batch is inserted one value at a time in sorted order.
+
+        Args:
+            values (iterable): values to insert
+
+        Returns:
+            int: number of values inserted
+        """
+        batch, keys = self._sorted_batch(values)
+        if not self.allow_dups:
+            unique = [index for index in range(len(keys))
+                      if index == 0 or keys[index - 1] < keys[index]]
+            if len(unique) < len(keys):
+                batch = [batch[index] for index in unique]
+                keys = batch if self.key is None else [keys[index] for index in unique]
+        if not batch:
+            return 0
+        if len(batch) * BST.MERGE_RATIO >= self._size:
+            return self._merge_insert(batch, keys)
+        old_size = self._size
+        for value, key in zip(batch, keys):
+            self._insert(value, key, self.root)
+        return self._size - old_size
+
+    def _sorted_batch(self, values):
+        """
+        Sort a batch of values by their keys, working each key out once.
+
+        Returns:
+            tuple: (sorted values, their keys)
+        """
+        if self.key is None:
+            batch = sorted(values)
+            return (batch, batch)
+        batch = list(values)
+        keys = [self.key(value) for value in batch]
+        order = sorted(range(len(batch)), key=keys.__getitem__)
+        return ([batch[index] for index in order], [keys[index] for index in order])
+
+    def _merge_insert(self, batch, keys):
+        """
+        Merge the sorted 'batch' (with its 'keys') into the tree by
+        flattening the tree into a vine, weaving new nodes into it and
+        rebuilding.
+        """
+        node, count = self._tree_to_vine(self.root)
+        head = None
+        tail = None
+        inserted = 0
+        index = 0
+        while node is not None or index < len(batch):
+            if node is None or (index < len(batch) and keys[index] < node.key):
+                value = batch[index]
+                key = keys[index]
+                index += 1
+                inserted += 1
+                if tail is not None and tail.key == key:
+                    # Repeats within the batch (only kept with allow_dups)
+                    tail.count += 1
+                    continue
+                taken = self._new_node(value, key)
+                count += 1
+            elif index < len(batch) and keys[index] == node.key:
+                if self.allow_dups:
+                    node.count += 1
+                    inserted += 1
+                index += 1
+                continue
+            else:
+                taken = node
+                node = node.greater_than
+            if tail is None:
+                head = taken
+            else:
+                tail.greater_than = taken
+            tail = taken
+        self.root, _ = self._vine_to_tree(head, count)
+        self._size += inserted
+        return inserted
+
+    def remove_many(self, values):
+        """Remove a batch of values at once.
+
+        Each value in the batch removes one matching value from the
+        tree.  Like insert_many, a large batch is merged against the
+        tree's nodes and the tree rebuilt in O(n + m), while a smaller
+        one is removed in sorted order.
+
+        Args:
+            values (iterable): values to remove
+
+        Returns:
+            int: number of values removed
+        """
+        batch = sorted(values if self.key is None else map(self.key, values))
+        if not batch or self.root is None:
+            return 0
+        if len(batch) * BST.MERGE_RATIO < self._size:
+            removed = 0
+            for value in batch:
+                if self._remove(value, self.root, None):
+                    removed += 1
+            self._size -= removed
+            return removed
+        node, count = self._tree_to_vine(self.root)
+        head = None
+        tail = None
+        removed = 0
+        index = 0
+        while node is not None:
+            following = node.greater_than
+            while index < len(batch) and batch[index] < node.key:
+                index += 1
+            while index < len(batch) and batch[index] == node.key and node.count > 0:
+                node.count -= 1
+                index += 1
+                removed += 1
+            if node.count == 0:
+                count -= 1
+            else:
+                if tail is None:
+                    head = node
+                else:
+                    tail.greater_than = node
+                tail = node
+            node = following
+        if tail is not None:
+            tail.greater_than = None
+        self.root, _ = self._vine_to_tree(head, count)
+        self._size -= removed
+        return removed
+
+    def contains_many(self, values):
+        """Check a batch of values at once.
+
+        A batch that is large compared to the tree is sorted and checked
+        in a single in-order walk of the tree, which is O(n + m log m)
+        instead of O(m log n).
+
+        Returns:
+            list: one bool per value (in the order given), True if the
+            value is in the BST
+        """
+        values = list(values) if self.key is None else [self.key(value) for value in values]
+        root = self.root
+        if len(values) * BST.MERGE_RATIO < self._size:
+            # Searching costs less than visiting every node
+            return [self._contains(value, root) for value in values]
+        # Walk the whole tree in order alongside the sorted batch
+        order = sorted(range(len(values)), key=values.__getitem__)
+        batch = [values[index] for index in order]
+        found = [False] * len(batch)
+        index = 0
+        stack = []
+        node = root
+        while index < len(batch) and (stack or node is not None):
+            if node is not None:
+                stack.append(node)
+                node = node.less_than
+                continue
+            node = stack.pop()
+            while index < len(batch) and batch[index] < node.key:
+                index += 1
+            while index < len(batch) and batch[index] == node.key:
+                found[index] = True
+                index += 1
+            node = node.greater_than
+        results = [False] * len(values)
+        for index, position in enumerate(order):
+            results[position] = found[index]
+        return results
 
     def __iter__(self):
         """
@@ -157,7 +576,7 @@ class BST:
             print(value)
 
         """
-        yield from self._traverse_forward(self.root)
+        return self._traverse_forward(self.root)
 
     def _traverse_forward(self, node):
         """
@@ -173,11 +592,21 @@ class BST:
 
         for value in my_bst:
             print(value)
+
+        The nodes still waiting on their "greater than" side are kept
+        on an explicit stack instead of recursing, so each value costs
+        O(1) amortized no matter how deep the tree is.
         """
-        if node is not None:
-            yield from self._traverse_forward(node.less_than)
-            yield node.data
-            yield from self._traverse_forward(node.greater_than)
+        stack = []
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.less_than
+            else:
+                node = stack.pop()
+                for _ in range(node.count):
+                    yield node.data
+                node = node.greater_than
 
     def traverse_forward(self):
         """Visit all nodes from smallest to largest.
@@ -200,7 +629,7 @@ class BST:
             print(value)
 
         """
-        yield from self._traverse_reverse(self.root)
+        return self._traverse_reverse(self.root)
 
     def _traverse_reverse(self, node):
         """
@@ -212,12 +641,19 @@ class BST:
         traverse on the left side (thus getting the smaller numbers last).
 
         This function is intended to be called the first time by
-        the __reversed__ function.
+        the __reversed__ function.  Like _traverse_forward, it uses an
+        explicit stack instead of recursion.
         """
-        if node is not None:
-            yield from self._traverse_reverse(node.greater_than)
-            yield node.data
-            yield from self._traverse_reverse(node.less_than)
+        stack = []
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.greater_than
+            else:
+                node = stack.pop()
+                for _ in range(node.count):
+                    yield node.data
+                node = node.less_than
 
     def traverse_reverse(self):
         """Visit all nodes from largest to smallest.
@@ -229,30 +665,326 @@ class BST:
             nodes.append(node)
         return nodes
 
-    def _partial_height(self, node):
-        """Get the tree height starting from a specific node.
+    def irange(self, lo=None, hi=None, reverse=False):
         """
-        if self.root is None:
-            return 0
-        return self._get_height(node)
+        Visit the values between 'lo' and 'hi' (both inclusive) in
+        order, or from largest to smallest if 'reverse' is True.  A
+        bound of None leaves that side open.
 
-    def _get_height(self, node):
+        Only the path to the first value is walked before anything is
+        yielded, so this is O(log n + k) for k values and a consumer
+        that stops early never pays for the rest:
+
+        for value in my_bst.irange('B', 'D'):
+            print(value)
+        """
+        if lo is not None:
+            lo = self._key_of(lo)
+        if hi is not None:
+            hi = self._key_of(hi)
+        if reverse:
+            return self._range_reverse(self.root, lo, hi)
+        return self._range_forward(self.root, lo, hi)
+
+    @staticmethod
+    def _range_forward(node, lo, hi):
+        """
+        Same as _traverse_forward, but skips the sub-trees that are
+        entirely below the key 'lo' and stops at the first value above
+        the key 'hi'.
+        """
+        stack = []
+        while node is not None:
+            if lo is not None and node.key < lo:
+                node = node.greater_than
+            else:
+                stack.append(node)
+                node = node.less_than
+        while stack:
+            node = stack.pop()
+            if hi is not None and node.key > hi:
+                return
+            for _ in range(node.count):
+                yield node.data
+            node = node.greater_than
+            while node is not None:
+                stack.append(node)
+                node = node.less_than
+
+    @staticmethod
+    def _range_reverse(node, lo, hi):
+        """
+        Same as _traverse_reverse, but skips the sub-trees that are
+        entirely above the key 'hi' and stops at the first value below
+        the key 'lo'.
+        """
+        stack = []
+        while node is not None:
+            if hi is not None and node.key > hi:
+                node = node.less_than
+            else:
+                stack.append(node)
+                node = node.greater_than
+        while stack:
+            node = stack.pop()
+            if lo is not None and node.key < lo:
+                return
+            for _ in range(node.count):
+                yield node.data
+            node = node.less_than
+            while node is not None:
+                stack.append(node)
+                node = node.greater_than
+
+    def minimum(self):
+        """Smallest value in the BST, or None if it is empty.
         """
-        Determine the height of the BST.  The height of a sub-tree
-        (represented by 'node') is 1 plus the height of either the
-        left sub-tree or the right sub-tree (whichever one is bigger).
+        node = self.root
+        if node is None:
+            return None
+        while node.less_than is not None:
+            node = node.less_than
+        return node.data
 
-        This function intended to be called the first time by
-        get_height.
+    def maximum(self):
+        """Largest value in the BST, or None if it is empty.
         """
+        node = self.root
         if node is None:
+            return None
+        while node.greater_than is not None:
+            node = node.greater_than
+        return node.data
+
+    def floor(self, value):
+        """Largest value less than or equal to 'value', or None.
+        """
+        return self._closest_below(value, inclusive=True)
+
+    def predecessor(self, value):
+        """Largest value strictly less than 'value', or None.
+        """
+        return self._closest_below(value, inclusive=False)
+
+    def ceiling(self, value):
+        """Smallest value greater than or equal to 'value', or None.
+        """
+        return self._closest_above(value, inclusive=True)
+
+    def successor(self, value):
+        """Smallest value strictly greater than 'value', or None.
+        """
+        return self._closest_above(value, inclusive=False)
+
+    def _closest_below(self, value, inclusive):
+        value = self._key_of(value)
+        found = None
+        node = self.root
+        while node is not None:
+            if node.key < value or (inclusive and node.key == value):
+                # Candidate, but something closer may be on the right
+                found = node
+                node = node.greater_than
+            else:
+                node = node.less_than
+        return None if found is None else found.data
+
+    def _closest_above(self, value, inclusive):
+        value = self._key_of(value)
+        found = None
+        node = self.root
+        while node is not None:
+            if node.key > value or (inclusive and node.key == value):
+                # Candidate, but something closer may be on the left
+                found = node
+                node = node.less_than
+            else:
+                node = node.greater_than
+        return None if found is None else found.data
+
+    def select(self, index):
+        """Get the value at a position in sorted order (0 is the smallest).
+
+        Negative positions count back from the largest value like a list.
+        Uses the sub-tree sizes kept in each node, so this is O(height).
+
+        Raises:
+            IndexError: if the position is outside of the BST
+        """
+        node = self.root
+        if index < 0:
+            index += self._subtree_size(node)
+        if not 0 <= index < self._subtree_size(node):
+            raise IndexError('BST index out of range')
+        while True:
+            less_size = self._subtree_size(node.less_than)
+            if index < less_size:
+                node = node.less_than
+            elif index < less_size + node.count:
+                return node.data
+            else:
+                index -= less_size + node.count
+                node = node.greater_than
+
+    def rank(self, value):
+        """Number of values in the BST strictly less than 'value'.
+        """
+        return self._count_below(self._key_of(value), False, self.root)
+
+    def count_range(self, lo=None, hi=None):
+        """Number of values between 'lo' and 'hi' (both inclusive) in O(height).
+
+        A bound of None leaves that side open, like irange.
+        """
+        root = self.root
+        if hi is None:
+            count = self._subtree_size(root)
+        else:
+            count = self._count_below(self._key_of(hi), True, root)
+        if lo is not None:
+            count -= self._count_below(self._key_of(lo), False, root)
+        return max(count, 0)
+
+    def _count_below(self, value, inclusive, node):
+        """
+        Count the values with keys below 'value' (or equal to it when
+        'inclusive') in the sub-tree represented by 'node' by adding up the sizes of
+        the sub-trees left behind on the way down.
+        """
+        count = 0
+        while node is not None:
+            if node.key < value or (inclusive and node.key == value):
+                count += self._subtree_size(node.less_than) + node.count
+                node = node.greater_than
+            else:
+                node = node.less_than
+        return count
+
+    def seek(self, value=None):
+        """Get a cursor at the smallest value greater than or equal to 'value'.
+
+        With no value the cursor starts at the smallest value in the BST.
+        If there is no such value, the cursor is not valid.
+
+        Returns:
+            BST.Cursor: cursor into this tree
+        """
+        if value is not None:
+            value = self._key_of(value)
+        path = []
+        ceiling_depth = 0
+        node = self.root
+        while node is not None:
+            path.append(node)
+            if value is None or not node.key < value:
+                ceiling_depth = len(path)
+                node = node.less_than
+            else:
+                node = node.greater_than
+        # The ceiling is the last node where the search turned left
+        del path[ceiling_depth:]
+        return BST.Cursor(path)
+
+    class Cursor:
+        """A position in a BST that can step forward and backward.
+
+        The cursor keeps the nodes from the root down to its position,
+        so each step is O(1) amortized and O(log n) at worst in a
+        balanced tree.  It walks the live tree, so it should not be
+        used after the tree has been changed.
+        """
+
+        __slots__ = ('_path',)
+
+        def __init__(self, path):
+            self._path = path
+
+        @property
+        def valid(self):
+            """True while the cursor points at a value.
+            """
+            return len(self._path) > 0
+
+        @property
+        def value(self):
+            """The value at the cursor, or None if it is not valid.
+            """
+            if self._path:
+                return self._path[-1].data
+            return None
+
+        def next(self):
+            """Move to the next larger distinct value and return it (None at the end).
+            """
+            self._step('greater_than', 'less_than')
+            return self.value
+
+        def prev(self):
+            """Move to the next smaller distinct value and return it (None at the start).
+            """
+            self._step('less_than', 'greater_than')
+            return self.value
+
+        def _step(self, forward, backward):
+            path = self._path
+            if not path:
+                return
+            node = getattr(path[-1], forward)
+            if node is not None:
+                # Leftmost node of the next sub-tree (or rightmost going back)
+                while node is not None:
+                    path.append(node)
+                    node = getattr(node, backward)
+                return
+            # Climb until we come up out of a child on the other side
+            child = path.pop()
+            while path and getattr(path[-1], forward) is child:
+                child = path.pop()
+
+        @property
+        def count(self):
+            """How many times the value at the cursor is in the tree.
+            """
+            if self._path:
+                return self._path[-1].count
             return 0
-        left_height = self._get_height(node.less_than) + 1
-        right_height = self._get_height(node.greater_than) + 1
 
-        if left_height > right_height:
-            return left_height
-        return right_height
+        def __iter__(self):
+            """Yield the value at the cursor and every larger value after it.
+            """
+            while self._path:
+                node = self._path[-1]
+                for _ in range(node.count):
+                    yield node.data
+                self.next()
+
+    def _partial_height(self, node):
+        """Get the tree height starting from a specific node.
+        """
+        return self._node_height(node)
+
+    def _get_height(self, node):
+        """
+        Determine the height of the BST by visiting every node.  The
+        height of a sub-tree (represented by 'node') is 1 plus the height
+        of either the left sub-tree or the right sub-tree (whichever one
+        is bigger).
+
+        Heights are cached in the nodes, so this is only used to check
+        the cached values.  Each node is pushed on an explicit stack
+        together with its depth instead of recursing.
+        """
+        tallest = 0
+        stack = [(node, 1)] if node is not None else []
+        while stack:
+            node, depth = stack.pop()
+            if depth > tallest:
+                tallest = depth
+            if node.less_than is not None:
+                stack.append((node.less_than, depth + 1))
+            if node.greater_than is not None:
+                stack.append((node.greater_than, depth + 1))
+        return tallest
 
     def height(self):
         """
@@ -260,12 +992,52 @@ class BST:
         will have a height of 0 and a tree with one item (root) will
         have a height of 1.
 
-        If the tree is empty, then return 0.  Otherwise, call
-        _get_height on the root which will recursively determine the
-        height of the tree.
+        Every node keeps the height of its own sub-tree up to date, so
+        this is O(1).
         """
         return self._partial_height(self.root)
 
+    def validate(self):
+        """Recompute everything cached in the nodes and check it (debug aid).
+
+        Checks the order of the values, every cached key, height and
+        sub-tree size, the tracked size and (if balanced) the AVL property.  This
+        visits every node, so it is O(n).
+
+        Raises:
+            AssertionError: if anything cached is out of date
+        """
+        assert self._node_height(self.root) == self._get_height(self.root), 'tree height is stale'
+        # Reversed pre-order visits both children before their parent
+        preorder = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            preorder.append(node)
+            if node.less_than is not None:
+                stack.append(node.less_than)
+            if node.greater_than is not None:
+                stack.append(node.greater_than)
+        for node in reversed(preorder):
+            less_height = self._node_height(node.less_than)
+            greater_height = self._node_height(node.greater_than)
+            assert node.height == max(less_height, greater_height) + 1, \
+                f'stale height at {node.data!r}'
+            assert node.count >= 1, f'empty node for {node.data!r}'
+            assert node.size == self._subtree_size(node.less_than) + \
+                self._subtree_size(node.greater_than) + node.count, f'stale size at {node.data!r}'
+            if self.balanced:
+                assert abs(less_height - greater_height) <= 1, f'unbalanced at {node.data!r}'
+            if self.key is not None:
+                assert node.key == self.key(node.data), f'stale key at {node.data!r}'
+        values = self.traverse_forward()
+        keys = values if self.key is None else [self.key(value) for value in values]
+        assert all(keys[i] <= keys[i + 1] for i in range(len(keys) - 1)), 'values out of order'
+        if not self.allow_dups:
+            assert all(node.count == 1 for node in preorder), 'duplicate in a tree without them'
+        assert len(values) == self._size, 'size does not match the number of values'
+        return True
+
     def __len__(self):
         """Allow use on len() on the BST to get the size.
         """
@@ -283,98 +1055,2402 @@ class BST:
         """
         return self.root is None
 
-    # Implement full tree rebalancing! (Optional)
-    def rebalance_tree(self):
-        """Rebalance the whole tree.
+    def save(self, path):
+        """Write the values to a snapshot file that BST.load can map.
 
-        This should extract all nodes into a list
-        and give the BST a new ideal height.
+        The file is a small header followed by every value in sorted
+        order as a little-endian signed 64-bit integer, so only integer
+        values (such as hashes) can be saved.  It is written to a
+        temporary file next to 'path' and only moved over it once it is
+        complete, so a failed save leaves the previous snapshot as it was.
+
+        Raises:
+            TypeError: if a value is not an integer
+            OverflowError: if a value does not fit in 64 bits
+            ValueError: if the tree has a key function, which cannot be saved
         """
-        pass
+        if self.key is not None:
+            raise ValueError('a BST with a key function cannot be saved')
+        flags = (SNAPSHOT_ALLOW_DUPS if self.allow_dups else 0) | \
+            (SNAPSHOT_BALANCED if self.balanced else 0)
+        values = iter(self)
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as snapshot:
+                snapshot.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, flags, self._size))
+                # Write in chunks so a big tree is never copied whole
+                while True:
+                    chunk = array('q', itertools.islice(values, 65_536))
+                    if not chunk:
+                        break
+                    if sys.byteorder == 'big':
+                        chunk.byteswap()
+                    chunk.tofile(snapshot)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
 
-    # Rebalance starting from a specific node! (Optional)
-    # Make sure to call this method on node insertion or removal.
-    def _rebalance_subtree(self, node):
-        pass
+    @staticmethod
+    def load(path, mmap=True):
+        """Open a snapshot written by BST.save.
 
+        With mmap=True the file is memory-mapped and queried in place,
+        so the tree can be used immediately however big it is.  Values
+        are only copied into a real BST once something changes it.
 
-def implement_basic_bst_hash_tree():
-    """Implement a BST that contains hashes of some objects of your choice.
-    Add several hashes to the tree.
-    Print the tree height.
-    Remove at least one of the hashes in the tree.
-    List the number of items in the tree.
-    Print the tree height.
-    Print out each node in reverse order.
-    Finally, print out each node in order.
+        Returns:
+            MappedBST: read-only view that turns into a BST when written to
 
-    Remember that Python has the builtin hash() function.
-    """
-    pass
+        Raises:
+            ValueError: if the file is not a BST snapshot, or is truncated
+        """
+        with open(path, 'rb') as snapshot:
+            header = snapshot.read(SNAPSHOT_HEADER.size)
+            if len(header) < SNAPSHOT_HEADER.size:
+                raise ValueError(f'{path} is not a BST snapshot')
+            magic, flags, count = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f'{path} is not a BST snapshot')
+            # Checked before reading, as a short file fails differently
+            # when mapped and when read
+            if os.fstat(snapshot.fileno()).st_size != SNAPSHOT_HEADER.size + 8 * count:
+                raise ValueError(f'{path} is truncated')
+            if mmap and sys.byteorder == 'little':
+                mapping = mmap_module.mmap(snapshot.fileno(), 0, access=mmap_module.ACCESS_READ)
+                keys = memoryview(mapping)[SNAPSHOT_HEADER.size:].cast('q')
+            else:
+                mapping = None
+                keys = array('q')
+                keys.fromfile(snapshot, count)
+                if sys.byteorder == 'big':
+                    keys.byteswap()
+        return MappedBST(keys, bool(flags & SNAPSHOT_ALLOW_DUPS),
+                         bool(flags & SNAPSHOT_BALANCED), mapping)
+
+    def split(self, value):
+        """Split the BST into the values below 'value' and the rest.
+
+        The nodes are reused rather than copied, so this BST is left
+        empty.  Only the nodes on the path to 'value' are relinked,
+        which is O(log n) for a balanced tree and O(height) otherwise.
+
+        Returns:
+            tuple: (BST of the values less than 'value',
+                    BST of the values greater than or equal to 'value')
+        """
+        key = self._key_of(value)
+        path = []
+        less_than = None
+        greater_than = None
+        node = self.root
+        while node is not None:
+            node = self._own(node)
+            if node.key == key:
+                less_than = node.less_than
+                greater_than = self._join3(None, node, node.greater_than)
+                break
+            path.append(node)
+            node = node.less_than if key < node.key else node.greater_than
+        # Join the sub-trees left behind on the way down, from the bottom up
+        for node in reversed(path):
+            if key < node.key:
+                greater_than = self._join3(greater_than, node, node.greater_than)
+            else:
+                less_than = self._join3(node.less_than, node, less_than)
+        trees = (self._empty_like(), self._empty_like())
+        for tree, root in zip(trees, (less_than, greater_than)):
+            tree.root = root
+            tree._size = self._subtree_size(root)
+        self.root = None
+        self._size = 0
+        return trees
 
+    @staticmethod
+    def join(less_than, greater_than):
+        """Join two BSTs where every value of the first is below every value of the second.
 
-# All tests are below this point
+        The nodes of both are reused, so both are left empty.  For
+        balanced trees this is O(log n); the smallest node of the second
+        tree becomes the link between the two.
+
+        Raises:
+            ValueError: if the values overlap or the trees are set up
+                differently (allow_dups, balanced, key or class)
+
+        Returns:
+            BST: tree with the values of both
+        """
+        less_than._check_compatible(greater_than)
+        tree = less_than._empty_like()
+        if less_than.root is not None and greater_than.root is not None:
+            if not less_than._extreme(less_than.root, 'greater_than').key < \
+                    greater_than._extreme(greater_than.root, 'less_than').key:
+                raise ValueError('join() requires every value of the first tree '
+                                 'to be below every value of the second')
+            rest, pivot = tree._detach_min(greater_than.root)
+            tree.root = tree._join3(less_than.root, pivot, rest)
+        else:
+            tree.root = less_than.root if greater_than.root is None else greater_than.root
+        tree._size = tree._subtree_size(tree.root)
+        for joined in (less_than, greater_than):
+            joined.root = None
+            joined._size = 0
+        return tree
+
+    @staticmethod
+    def merge(first, second):
+        """Merge two BSTs with any values into one in O(m + n).
+
+        Both trees are flattened into sorted vines, which are woven
+        together and rebuilt into a tree of minimal height.  The nodes
+        of both are reused, so both are left empty.  A value in both
+        trees is counted twice if duplicates are allowed and kept once
+        (from 'first') otherwise.
+
+        Raises:
+            ValueError: if the trees are set up differently
+
+        Returns:
+            BST: tree with the values of both
+        """
+        first._check_compatible(second)
+        tree = first._empty_like()
+        node, _ = first._tree_to_vine(first.root)
+        other, _ = second._tree_to_vine(second.root)
+        head = None
+        tail = None
+        count = 0
+        while node is not None or other is not None:
+            if other is None or (node is not None and not other.key < node.key):
+                taken = node
+                node = node.greater_than
+                if other is not None and other.key == taken.key:
+                    if tree.allow_dups:
+                        taken.count += other.count
+                    other = other.greater_than
+            else:
+                taken = other
+                other = other.greater_than
+            if tail is None:
+                head = taken
+            else:
+                tail.greater_than = taken
+            tail = taken
+            count += 1
+        tree.root, _ = tree._vine_to_tree(head, count)
+        tree._size = tree._subtree_size(tree.root)
+        for merged in (first, second):
+            merged.root = None
+            merged._size = 0
+        return tree
+
+    def _empty_like(self):
+        """An empty tree of the same class and settings as this one.
+        """
+        return type(self)(allow_dups=self.allow_dups, balanced=self.balanced, key=self.key)
+
+    def _check_compatible(self, other):
+        if other is self:
+            raise ValueError('cannot combine a tree with itself')
+        if type(other) is not type(self) or other.allow_dups != self.allow_dups or \
+                other.balanced != self.balanced or other.key is not self.key:
+            raise ValueError('cannot combine trees with different settings')
+
+    @staticmethod
+    def _extreme(node, side):
+        """Last node reached from 'node' by always following 'side'.
+        """
+        while getattr(node, side) is not None:
+            node = getattr(node, side)
+        return node
+
+    @staticmethod
+    def _own(node):
+        """
+        Get a node that can be changed in place.  The nodes of a BST
+        are its own, but a subclass that shares nodes can copy here.
+        """
+        return node
+
+    def _join3(self, less_than, pivot, greater_than):
+        """
+        Link the sub-trees 'less_than' and 'greater_than' under 'pivot',
+        where every value of 'less_than' is below the pivot and every
+        value of 'greater_than' above it.  A balanced tree hangs the
+        pivot further down the taller side where the heights match and
+        repairs that side on the way back up, which is O(difference in
+        height).
+
+        Returns:
+            Node: root of the joined sub-tree
+        """
+        less_height = self._node_height(less_than)
+        greater_height = self._node_height(greater_than)
+        if self.balanced and less_height > greater_height + 1:
+            taller, side = less_than, 'greater_than'
+        elif self.balanced and greater_height > less_height + 1:
+            taller, side = greater_than, 'less_than'
+        else:
+            pivot.less_than = less_than
+            pivot.greater_than = greater_than
+            return self._refresh(pivot)
+        shorter_height = min(less_height, greater_height)
+        path = []
+        node = taller
+        while self._node_height(node) > shorter_height + 1:
+            node = self._own(node)
+            path.append(node)
+            node = getattr(node, side)
+        if side == 'greater_than':
+            pivot.less_than = node
+            pivot.greater_than = greater_than
+        else:
+            pivot.less_than = less_than
+            pivot.greater_than = node
+        subtree = self._refresh(pivot)
+        for node in reversed(path):
+            setattr(node, side, subtree)
+            subtree = self._refresh(node)
+        return subtree
+
+    def _detach_min(self, node):
+        """
+        Unlink the smallest node of the sub-tree represented by 'node'.
+
+        Returns:
+            tuple: (root of the rest of the sub-tree, smallest node)
+        """
+        path = []
+        node = self._own(node)
+        while node.less_than is not None:
+            path.append(node)
+            node = self._own(node.less_than)
+        subtree = node.greater_than
+        for parent in reversed(path):
+            parent.less_than = subtree
+            subtree = self._refresh(parent)
+        return (subtree, node)
+
+    def freeze(self):
+        """Copy the values into an immutable FrozenBST.
+
+        The frozen copy is one sorted array answering lookups, ranges
+        and ranks by binary search, in a fraction of the memory of the
+        nodes.  This tree is left as it is.
+
+        Returns:
+            FrozenBST: sorted, read-only copy of the values
+        """
+        keys = []
+        values = []
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.less_than
+                continue
+            node = stack.pop()
+            for _ in range(node.count):
+                keys.append(node.key)
+                values.append(node.data)
+            node = node.greater_than
+        if self.key is None:
+            return FrozenBST(FrozenBST._pack(keys), allow_dups=self.allow_dups)
+        return FrozenBST(FrozenBST._pack(keys), values, allow_dups=self.allow_dups, key=self.key)
+
+    def instrument(self, callback=None):
+        """Start counting the work done by this tree (see InstrumentedBST).
+
+        Only a plain BST can be switched over, as the counting replaces
+        its class.  InstrumentedBST.uninstrument() switches it back.
+
+        Returns:
+            InstrumentedBST: this tree
+        """
+        if type(self) is not BST:
+            raise TypeError(f'cannot instrument a {type(self).__name__}')
+        self.__class__ = InstrumentedBST
+        self._start_counting(callback)
+        return self
+
+    def rebalance_tree(self):
+        """Rebalance the whole tree.
+
+        The existing nodes are first relinked into a sorted "vine"
+        (a linked list along the "greater than" side) and then
+        rebuilt into a tree of minimal height.  Both steps are O(n)
+        and no new nodes are allocated.
+        """
+        head, count = self._tree_to_vine(self.root)
+        self.root, _ = self._vine_to_tree(head, count)
 
-# Name Search Tree Example
-name_bst = BST()
-name_bst.insert('Ronald')
-name_bst.insert('Bruh')
-name_bst.insert('Dylan')
-name_bst.insert('Ana')
-name_bst.insert('Victor')
-name_bst.insert('Willard')
-name_bst.insert('Thomas')
+    @staticmethod
+    def _tree_to_vine(node):
+        """
+        Flatten the sub-tree represented by 'node' into a vine by
+        rotating every "less than" child up into the spine.  This only
+        needs a constant amount of extra memory.
+
+        Returns:
+            tuple: (smallest node of the vine, number of nodes)
+        """
+        head = None
+        tail = None
+        count = 0
+        while node is not None:
+            if node.less_than is None:
+                # Nothing smaller is left, so the node joins the vine
+                if tail is None:
+                    head = node
+                else:
+                    tail.greater_than = node
+                tail = node
+                count += 1
+                node = node.greater_than
+            else:
+                # Rotate right to bring the smaller values up
+                pivot = node.less_than
+                node.less_than = pivot.greater_than
+                pivot.greater_than = node
+                node = pivot
+        return (head, count)
+
+    def _vine_to_tree(self, head, count):
+        """
+        Build a tree of minimal height out of the first 'count' nodes
+        of the vine starting at 'head'.  The vine is consumed in order,
+        so each node is visited exactly once.
 
-# True
-print('Bruh' in name_bst)
-assert 'Bruh' in name_bst
+        Returns:
+            tuple: (root of the new sub-tree, first unused node of the vine)
+        """
+        if count == 0:
+            return (None, head)
+        less_count = count // 2
+        less_than, node = self._vine_to_tree(head, less_count)
+        greater_than, head = self._vine_to_tree(node.greater_than, count - less_count - 1)
+        node.less_than = less_than
+        node.greater_than = greater_than
+        node.size = self._subtree_size(less_than) + self._subtree_size(greater_than) + node.count
+        self._update_height(node)
+        return (node, head)
+
+    def _refresh(self, node):
+        """
+        Recompute the cached size and height of 'node' from its children,
+        rotating it in a balanced tree.  Returns the new root of the
+        sub-tree.
+        """
+        node.size = self._subtree_size(node.less_than) + \
+            self._subtree_size(node.greater_than) + node.count
+        if self.balanced:
+            return self._rebalance_subtree(node)
+        self._update_height(node)
+        return node
 
-# ['Ana', 'Bruh', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
-print(name_bst.traverse_forward())
-assert name_bst.traverse_forward() == \
-    ['Ana', 'Bruh', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
+    def _rebalance_subtree(self, node):
+        """
+        Refresh the cached height of 'node' and rotate if its sub-trees
+        differ in height by more than one (the AVL property).  Both
+        sub-trees must already be balanced.  Returns the new root of
+        the sub-tree.
+        """
+        self._update_height(node)
+        balance = self._balance_factor(node)
+        # Left heavy
+        if balance > 1:
+            if self._balance_factor(node.less_than) < 0:
+                node.less_than = self._rotate_left(node.less_than)
+            return self._rotate_right(node)
+        # Right heavy
+        if balance < -1:
+            if self._balance_factor(node.greater_than) > 0:
+                node.greater_than = self._rotate_right(node.greater_than)
+            return self._rotate_left(node)
+        return node
+
+    def _rotate_left(self, node):
+        """Rotate a sub-tree left and return its new root.
+        """
+        pivot = node.greater_than
+        node.greater_than = pivot.less_than
+        pivot.less_than = node
+        pivot.size = node.size
+        node.size = self._subtree_size(node.less_than) + \
+            self._subtree_size(node.greater_than) + node.count
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
+
+    def _rotate_right(self, node):
+        """Rotate a sub-tree right and return its new root.
+        """
+        pivot = node.less_than
+        node.less_than = pivot.greater_than
+        pivot.greater_than = node
+        pivot.size = node.size
+        node.size = self._subtree_size(node.less_than) + \
+            self._subtree_size(node.greater_than) + node.count
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
 
-name_bst.remove('Bruh')
+    @staticmethod
+    def _node_height(node):
+        """Cached height of a node, where an empty sub-tree has a height of 0.
+        """
+        if node is None:
+            return 0
+        return node.height
 
-# ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
-print(name_bst.traverse_forward())
-assert name_bst.traverse_forward() == ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
+    @staticmethod
+    def _subtree_size(node):
+        """Number of nodes in a sub-tree, read from the node in O(1).
+        """
+        if node is None:
+            return 0
+        return node.size
 
-# 3
-print(name_bst.height())
-assert name_bst.height() == 3
+    def _update_height(self, node):
+        node.height = max(self._node_height(node.less_than),
+                          self._node_height(node.greater_than)) + 1
 
-# 6
-print(name_bst.size)
-assert name_bst.size == 6
+    def _balance_factor(self, node):
+        return self._node_height(node.less_than) - self._node_height(node.greater_than)
 
-name_bst.insert('Zester')
-name_bst.insert('Zilliam')
 
-# 5 or 4 if AVL balancing is implemented, 7 if not (Optional)
-name_bst.rebalance_tree()
-print(name_bst.height())
-assert name_bst.height() > 4 and name_bst.height() < 7
+class CompactBST:
+    """Binary Search Tree for integer keys (such as hashes) stored as arrays.
 
-name_bst.remove('Zester')
+    Instead of one Python object per node, every node is an index into
+    three parallel arrays: a signed 64-bit key and the indices of its
+    "less than" and "greater than" children.  Removed slots are kept on
+    a free list and reused by later inserts.  This needs 16 bytes per
+    node instead of a full object plus a boxed integer, while keeping
+    the same insert/remove/in/iteration interface as BST.
+    """
 
-# ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard', 'Zilliam']
-print(name_bst.traverse_forward())
-assert name_bst.traverse_forward() ==  \
-    ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+    # Index used for a missing child, like None for BST.Node
+    NIL = -1
 
-name_bst.remove('Ronald')
+    def __init__(self, allow_dups=False):
+        self._keys = array('q')
+        self._less_than = array('i')
+        self._greater_than = array('i')
+        # Free slots are chained together through _less_than
+        self._free = CompactBST.NIL
+        self._size = 0
+        self.root = CompactBST.NIL
+        self.allow_dups = allow_dups
 
-# ['Ana', 'Dylan', 'Thomas', 'Victor', 'Willard', 'Zilliam']
-print(name_bst.traverse_forward())
-assert name_bst.traverse_forward() == ['Ana', 'Dylan', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+    def _new_node(self, data):
+        """Store a key in a free slot (or a new one) and return its index.
+        """
+        index = self._free
+        if index == CompactBST.NIL:
+            self._keys.append(data)
+            self._less_than.append(CompactBST.NIL)
+            self._greater_than.append(CompactBST.NIL)
+            return len(self._keys) - 1
+        # Store the key first, so a key that does not fit leaves the slot free
+        self._keys[index] = data
+        self._free = self._less_than[index]
+        self._less_than[index] = CompactBST.NIL
+        self._greater_than[index] = CompactBST.NIL
+        return index
+
+    def _free_node(self, index):
+        self._less_than[index] = self._free
+        self._greater_than[index] = CompactBST.NIL
+        self._free = index
 
-name_bst.rebalance_tree()
+    def insert(self, value):
+        """Insert a value into the BST.
 
-# 4
-print(name_bst.height())
-assert name_bst.height() == 4
+        Args:
+            value (int): value to insert to BST, must fit in 64 bits
+        """
+        keys = self._keys
+        less_than = self._less_than
+        greater_than = self._greater_than
+        node = self.root
+        if node == CompactBST.NIL:
+            self.root = self._new_node(value)
+            self._size += 1
+            return
+        while True:
+            if value < keys[node]:
+                if less_than[node] == CompactBST.NIL:
+                    less_than[node] = self._new_node(value)
+                    break
+                node = less_than[node]
+            elif value == keys[node] and not self.allow_dups:
+                return
+            else:
+                if greater_than[node] == CompactBST.NIL:
+                    greater_than[node] = self._new_node(value)
+                    break
+                node = greater_than[node]
+        self._size += 1
 
+    def remove(self, value):
+        """Remove a value from the BST if it is present.
 
-# Run challenge code
-implement_basic_bst_hash_tree()
+        Returns:
+            bool: True if the value was found and removed
+        """
+        keys = self._keys
+        less_than = self._less_than
+        greater_than = self._greater_than
+        parent = CompactBST.NIL
+        node = self.root
+        while node != CompactBST.NIL and keys[node] != value:
+            parent = node
+            if value < keys[node]:
+                node = less_than[node]
+            else:
+                node = greater_than[node]
+        # Data not in tree
+        if node == CompactBST.NIL:
+            return False
+        if less_than[node] == CompactBST.NIL:
+            self._replace_child(node, parent, greater_than[node])
+        elif greater_than[node] == CompactBST.NIL:
+            self._replace_child(node, parent, less_than[node])
+        else:
+            # The largest key on the "less than" side takes its place
+            replacement_parent = node
+            replacement = less_than[node]
+            while greater_than[replacement] != CompactBST.NIL:
+                replacement_parent = replacement
+                replacement = greater_than[replacement]
+            self._replace_child(replacement, replacement_parent, less_than[replacement])
+            self._replace_child(node, parent, replacement)
+            less_than[replacement] = less_than[node]
+            greater_than[replacement] = greater_than[node]
+        self._free_node(node)
+        self._size -= 1
+        return True
+
+    def _replace_child(self, node, parent, replacement):
+        if parent == CompactBST.NIL:
+            self.root = replacement
+        elif self._less_than[parent] == node:
+            self._less_than[parent] = replacement
+        else:
+            self._greater_than[parent] = replacement
+
+    def __contains__(self, value):
+        keys = self._keys
+        node = self.root
+        while node != CompactBST.NIL:
+            key = keys[node]
+            if key == value:
+                return True
+            if value < key:
+                node = self._less_than[node]
+            else:
+                node = self._greater_than[node]
+        return False
+
+    def _traverse_indices(self, reverse=False):
+        """Yield node indices in order (or reverse order) using a stack.
+        """
+        first, second = self._less_than, self._greater_than
+        if reverse:
+            first, second = second, first
+        stack = []
+        node = self.root
+        while stack or node != CompactBST.NIL:
+            if node != CompactBST.NIL:
+                stack.append(node)
+                node = first[node]
+            else:
+                node = stack.pop()
+                yield node
+                node = second[node]
+
+    def __iter__(self):
+        keys = self._keys
+        return (keys[node] for node in self._traverse_indices())
+
+    def __reversed__(self):
+        keys = self._keys
+        return (keys[node] for node in self._traverse_indices(reverse=True))
+
+    def traverse_forward(self):
+        """Visit all nodes from smallest to largest.
+
+            Returns: nodes (list)
+        """
+        return list(self)
+
+    def traverse_reverse(self):
+        """Visit all nodes from largest to smallest.
+
+            Returns: nodes (list)
+        """
+        return list(reversed(self))
+
+    def height(self):
+        """
+        Determine the height of the BST.  An empty tree has a height
+        of 0 and a tree with one item (root) has a height of 1.
+        """
+        tallest = 0
+        stack = [(self.root, 1)] if self.root != CompactBST.NIL else []
+        while stack:
+            node, depth = stack.pop()
+            if depth > tallest:
+                tallest = depth
+            if self._less_than[node] != CompactBST.NIL:
+                stack.append((self._less_than[node], depth + 1))
+            if self._greater_than[node] != CompactBST.NIL:
+                stack.append((self._greater_than[node], depth + 1))
+        return tallest
+
+    def rebalance_tree(self):
+        """Rebalance the whole tree by relinking the existing slots.
+        """
+        order = array('i', self._traverse_indices())
+        self.root = self._build_subtree(order, 0, len(order))
+
+    def _build_subtree(self, order, start, stop):
+        """Link order[start:stop] into a tree of minimal height and return its root.
+        """
+        if start == stop:
+            return CompactBST.NIL
+        middle = (start + stop) // 2
+        node = order[middle]
+        self._less_than[node] = self._build_subtree(order, start, middle)
+        self._greater_than[node] = self._build_subtree(order, middle + 1, stop)
+        return node
+
+    def __len__(self):
+        """Allow use on len() on the BST to get the size.
+        """
+        return self._size
+
+    @property
+    def size(self):
+        """Return the size of the BST.
+        """
+        return self._size
+
+    @property
+    def empty(self):
+        """Returns True if the root node is empty.
+        """
+        return self.root == CompactBST.NIL
+
+
+class BTree:
+    """B-tree with the same interface as BST.
+
+    Each node holds a sorted list of up to order - 1 values (searched
+    with bisect) and, unless it is a leaf, one more child than values.
+    All leaves are at the same depth, so the tree stays balanced and a
+    lookup visits about log(n) / log(order / 2) nodes instead of
+    log2(n) nodes for a balanced BST.
+    """
+
+    class Node:
+        """A node holding a sorted list of values and its children.
+        """
+
+        __slots__ = ('keys', 'children')
+
+        def __init__(self, keys=None, children=None):
+            self.keys = [] if keys is None else keys
+            # Empty for leaves
+            self.children = [] if children is None else children
+
+    def __init__(self, allow_dups=False, order=64):
+        """Create an empty B-tree.
+
+        Args:
+            allow_dups (bool): allow the same value to be inserted more than once
+            order (int): most children a node may have (at least 4)
+        """
+        if order < 4:
+            raise ValueError('a B-tree needs an order of at least 4')
+        # Every node but the root keeps between _min_degree - 1 and
+        # 2 * _min_degree - 1 values
+        self._min_degree = order // 2
+        self._max_keys = 2 * self._min_degree - 1
+        self._size = 0
+        self._levels = 1
+        self.root = BTree.Node()
+        self.allow_dups = allow_dups
+
+    def insert(self, value):
+        """Insert a value into the B-tree.
+
+        Full nodes are split on the way down, so there is always room
+        to add the value once a leaf is reached.
+
+        Args:
+            value (any comparable): value to insert
+        """
+        if len(self.root.keys) == self._max_keys:
+            self.root = BTree.Node(children=[self.root])
+            self._split_child(self.root, 0)
+            self._levels += 1
+        node = self.root
+        while True:
+            if self.allow_dups:
+                # Duplicates go after the values they equal
+                index = bisect.bisect_right(node.keys, value)
+            else:
+                index = bisect.bisect_left(node.keys, value)
+                if index < len(node.keys) and node.keys[index] == value:
+                    return
+            if not node.children:
+                node.keys.insert(index, value)
+                self._size += 1
+                return
+            if len(node.children[index].keys) == self._max_keys:
+                self._split_child(node, index)
+                # The middle value of the child moved up to node.keys[index]
+                middle = node.keys[index]
+                if value == middle and not self.allow_dups:
+                    return
+                if value > middle or (value == middle and self.allow_dups):
+                    index += 1
+            node = node.children[index]
+
+    def _split_child(self, parent, index):
+        """Split the full child at 'index', moving its middle value up.
+        """
+        child = parent.children[index]
+        middle = self._min_degree - 1
+        sibling = BTree.Node(child.keys[middle + 1:], child.children[middle + 1:])
+        parent.keys.insert(index, child.keys[middle])
+        parent.children.insert(index + 1, sibling)
+        del child.keys[middle:]
+        del child.children[middle + 1:]
+
+    def remove(self, value):
+        """Remove a value from the B-tree if it is present.
+
+        Before stepping into a child that has the fewest values allowed,
+        a value is borrowed from a sibling or the child is merged with
+        one, so a value can always be taken out of a leaf directly.
+
+        Returns:
+            bool: True if the value was found and removed
+        """
+        removed = False
+        node = self.root
+        while True:
+            index = bisect.bisect_left(node.keys, value)
+            found = index < len(node.keys) and node.keys[index] == value
+            if not node.children:
+                if found:
+                    del node.keys[index]
+                    self._size -= 1
+                    removed = True
+                break
+            if found:
+                less_than = node.children[index]
+                greater_than = node.children[index + 1]
+                if len(less_than.keys) >= self._min_degree:
+                    # Swap in the largest smaller value and remove that instead
+                    value = self._last_key(less_than)
+                    node.keys[index] = value
+                    node = less_than
+                elif len(greater_than.keys) >= self._min_degree:
+                    value = self._first_key(greater_than)
+                    node.keys[index] = value
+                    node = greater_than
+                else:
+                    self._merge_children(node, index)
+                    node = less_than
+            else:
+                if len(node.children[index].keys) < self._min_degree:
+                    index = self._fill_child(node, index)
+                node = node.children[index]
+        # A merge can leave the root without values
+        if not self.root.keys and self.root.children:
+            self.root = self.root.children[0]
+            self._levels -= 1
+        return removed
+
+    @staticmethod
+    def _first_key(node):
+        while node.children:
+            node = node.children[0]
+        return node.keys[0]
+
+    @staticmethod
+    def _last_key(node):
+        while node.children:
+            node = node.children[-1]
+        return node.keys[-1]
+
+    def _fill_child(self, parent, index):
+        """
+        Give the child at 'index' an extra value by borrowing from a
+        sibling or merging with one.  Returns the index of the child
+        that now holds its values.
+        """
+        child = parent.children[index]
+        if index > 0 and len(parent.children[index - 1].keys) >= self._min_degree:
+            sibling = parent.children[index - 1]
+            child.keys.insert(0, parent.keys[index - 1])
+            parent.keys[index - 1] = sibling.keys.pop()
+            if sibling.children:
+                child.children.insert(0, sibling.children.pop())
+            return index
+        if index < len(parent.keys) and len(parent.children[index + 1].keys) >= self._min_degree:
+            sibling = parent.children[index + 1]
+            child.keys.append(parent.keys[index])
+            parent.keys[index] = sibling.keys.pop(0)
+            if sibling.children:
+                child.children.append(sibling.children.pop(0))
+            return index
+        if index < len(parent.keys):
+            self._merge_children(parent, index)
+            return index
+        self._merge_children(parent, index - 1)
+        return index - 1
+
+    @staticmethod
+    def _merge_children(parent, index):
+        """Merge the child at index + 1 and the value between them into the child at 'index'.
+        """
+        child = parent.children[index]
+        sibling = parent.children.pop(index + 1)
+        child.keys.append(parent.keys.pop(index))
+        child.keys.extend(sibling.keys)
+        child.children.extend(sibling.children)
+
+    def __contains__(self, value):
+        node = self.root
+        while True:
+            index = bisect.bisect_left(node.keys, value)
+            if index < len(node.keys) and node.keys[index] == value:
+                return True
+            if not node.children:
+                return False
+            node = node.children[index]
+
+    def __iter__(self):
+        """Visit every value from smallest to largest using an explicit stack.
+        """
+        stack = [(self.root, 0)]
+        while stack:
+            node, index = stack.pop()
+            if not node.children:
+                yield from node.keys
+            elif index < len(node.children):
+                if index > 0:
+                    yield node.keys[index - 1]
+                stack.append((node, index + 1))
+                stack.append((node.children[index], 0))
+
+    def __reversed__(self):
+        """Visit every value from largest to smallest using an explicit stack.
+        """
+        stack = [(self.root, len(self.root.children) - 1)]
+        while stack:
+            node, index = stack.pop()
+            if not node.children:
+                yield from reversed(node.keys)
+            elif index >= 0:
+                if index < len(node.keys):
+                    yield node.keys[index]
+                stack.append((node, index - 1))
+                stack.append((node.children[index], len(node.children[index].children) - 1))
+
+    def traverse_forward(self):
+        """Visit all values from smallest to largest.
+
+            Returns: values (list)
+        """
+        return list(self)
+
+    def traverse_reverse(self):
+        """Visit all values from largest to smallest.
+
+            Returns: values (list)
+        """
+        return list(reversed(self))
+
+    def height(self):
+        """Number of levels of nodes, 0 if the tree is empty.
+        """
+        if self._size == 0:
+            return 0
+        return self._levels
+
+    def __len__(self):
+        """Allow use on len() on the B-tree to get the size.
+        """
+        return self._size
+
+    @property
+    def size(self):
+        """Return the size of the B-tree.
+        """
+        return self._size
+
+    @property
+    def empty(self):
+        """Returns True if there are no values.
+        """
+        return self._size == 0
+
+
+class FrozenBST:
+    """Immutable BST flattened into one sorted array.
+
+    The values are kept in order in a single contiguous array (an
+    array('q') when they are 64-bit integers, otherwise a list), so a
+    frozen tree takes a fraction of the memory of the nodes.  Every
+    query is a binary search, and ranges are slices of the array.
+    Batches of lookups use NumPy's vectorized searchsorted when NumPy
+    is installed.  Make one with BST.freeze() and go back with thaw().
+    """
+
+    def __init__(self, keys, values=None, allow_dups=False, key=None):
+        """
+        Args:
+            keys (sequence): sorted keys of the values, searchable with bisect
+            values (sequence): the values in the same order, if they are
+                not the keys themselves
+            allow_dups (bool): whether 'keys' may repeat
+            key (function): the key function the keys came from
+        """
+        self._keys = keys
+        self._values = keys if values is None else values
+        self.allow_dups = allow_dups
+        self.key = key
+
+    @staticmethod
+    def _pack(keys):
+        """Put keys into a compact array('q') if they are all 64-bit integers.
+
+        Subclasses of int such as bool and IntEnum are left in the list,
+        as the array would turn them into plain integers.
+        """
+        if not all(type(key) is int for key in keys):
+            return keys
+        try:
+            return array('q', keys)
+        except OverflowError:
+            return keys
+
+    def thaw(self, balanced=False):
+        """Build a mutable BST of these values in O(n).
+        """
+        return BST.from_sorted(self._values, allow_dups=self.allow_dups, balanced=balanced,
+                               key=self.key)
+
+    def _key_of(self, value):
+        return value if self.key is None else self.key(value)
+
+    def __contains__(self, value):
+        key = self._key_of(value)
+        index = bisect.bisect_left(self._keys, key)
+        return index < len(self._keys) and self._keys[index] == key
+
+    def contains_many(self, values):
+        """Check a batch of values at once.
+
+        With NumPy installed and integer keys, the whole batch is looked
+        up in one call to searchsorted, and a NumPy array of probes gets
+        a NumPy array of bools back.
+
+        Returns:
+            list: one bool per value (in the order given), True if the
+            value is in the tree
+        """
+        if numpy is not None and isinstance(self._keys, (array, memoryview)) and self.key is None:
+            keys = numpy.frombuffer(self._keys, dtype=numpy.int64)
+            probes = numpy.asarray(values)
+            if probes.dtype.kind in 'iu':
+                indices = numpy.minimum(keys.searchsorted(probes), max(len(keys) - 1, 0))
+                found = (keys[indices] == probes) if len(keys) else \
+                    numpy.zeros(probes.shape, dtype=bool)
+                return found if isinstance(values, numpy.ndarray) else found.tolist()
+        return [value in self for value in values]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __reversed__(self):
+        return reversed(self._values)
+
+    def traverse_forward(self):
+        """Visit all nodes from smallest to largest.
+
+            Returns: nodes (list)
+        """
+        return list(self._values)
+
+    def traverse_reverse(self):
+        """Visit all nodes from largest to smallest.
+
+            Returns: nodes (list)
+        """
+        return list(reversed(self._values))
+
+    def irange(self, lo=None, hi=None, reverse=False):
+        """Visit the values between 'lo' and 'hi' (both inclusive), see BST.irange.
+        """
+        start = 0 if lo is None else bisect.bisect_left(self._keys, self._key_of(lo))
+        stop = len(self._keys) if hi is None else \
+            bisect.bisect_right(self._keys, self._key_of(hi))
+        # Values are read one index at a time rather than sliced, as a
+        # slice of a memory-mapped snapshot would keep the file open
+        indices = range(start, stop)
+        return map(self._values.__getitem__, reversed(indices) if reverse else indices)
+
+    def minimum(self):
+        """Smallest value, or None if there are none.
+        """
+        return self._values[0] if self._values else None
+
+    def maximum(self):
+        """Largest value, or None if there are none.
+        """
+        return self._values[-1] if self._values else None
+
+    def floor(self, value):
+        """Largest value less than or equal to 'value', or None.
+        """
+        return self._value_at(bisect.bisect_right(self._keys, self._key_of(value)) - 1)
+
+    def predecessor(self, value):
+        """Largest value strictly less than 'value', or None.
+        """
+        return self._value_at(bisect.bisect_left(self._keys, self._key_of(value)) - 1)
+
+    def ceiling(self, value):
+        """Smallest value greater than or equal to 'value', or None.
+        """
+        return self._value_at(bisect.bisect_left(self._keys, self._key_of(value)))
+
+    def successor(self, value):
+        """Smallest value strictly greater than 'value', or None.
+        """
+        return self._value_at(bisect.bisect_right(self._keys, self._key_of(value)))
+
+    def _value_at(self, index):
+        return self._values[index] if 0 <= index < len(self._values) else None
+
+    def select(self, index):
+        """Get the value at a position in sorted order, see BST.select.
+
+        Raises:
+            IndexError: if the position is outside of the tree
+        """
+        try:
+            return self._values[index]
+        except IndexError:
+            raise IndexError('BST index out of range') from None
+
+    def rank(self, value):
+        """Number of values strictly less than 'value'.
+        """
+        return bisect.bisect_left(self._keys, self._key_of(value))
+
+    def count_range(self, lo=None, hi=None):
+        """Number of values between 'lo' and 'hi' (both inclusive).
+        """
+        start = 0 if lo is None else bisect.bisect_left(self._keys, self._key_of(lo))
+        stop = len(self._keys) if hi is None else \
+            bisect.bisect_right(self._keys, self._key_of(hi))
+        return max(stop - start, 0)
+
+    def height(self):
+        """Height of the tree of minimal height holding these values.
+        """
+        return len(self._keys).bit_length()
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def size(self):
+        """Return the size of the BST.
+        """
+        return len(self._keys)
+
+    @property
+    def empty(self):
+        """Returns True if there are no values.
+        """
+        return len(self._keys) == 0
+
+
+class MappedBST:
+    """Read-only view of a BST snapshot that becomes a BST when written to.
+
+    Reads are answered by a FrozenBST over the sorted values of the
+    snapshot, so nothing is deserialized up front.  The first change
+    (or any method a FrozenBST does not have) builds a BST from the
+    values in O(n), and everything is handed to that tree from then on.
+    Promoting does not close the memory-mapped file, as iterators over
+    the snapshot may still be reading it; it is closed once the last of
+    them is gone, or straight away by close().
+    """
+
+    def __init__(self, keys, allow_dups=False, balanced=False, mapping=None):
+        self._frozen = FrozenBST(keys, allow_dups=allow_dups)
+        self._mapping = mapping
+        self._tree = None
+        self.allow_dups = allow_dups
+        self.balanced = balanced
+
+    def _promote(self):
+        """Build the mutable BST if it does not exist yet and return it.
+        """
+        if self._tree is None:
+            self._tree = self._frozen.thaw(balanced=self.balanced)
+            # Let go of the snapshot without releasing it, so readers
+            # still iterating over it can finish
+            self._mapping = None
+            self._frozen = FrozenBST(array('q'), allow_dups=self.allow_dups)
+        return self._tree
+
+    @property
+    def promoted(self):
+        """True once the values have been copied into a real BST.
+        """
+        return self._tree is not None
+
+    def close(self):
+        """Release the memory-mapped file (the view is empty afterwards if
+        it was never promoted).
+
+        If something still holds part of the mapped values, the file is
+        closed once that is let go instead.
+        """
+        try:
+            if isinstance(self._frozen._keys, memoryview):
+                self._frozen._keys.release()
+            if self._mapping is not None:
+                self._mapping.close()
+        except BufferError:
+            pass
+        self._mapping = None
+        self._frozen = FrozenBST(array('q'), allow_dups=self.allow_dups)
+
+    def _view(self):
+        return self._frozen if self._tree is None else self._tree
+
+    def __getattr__(self, name):
+        # Reads a FrozenBST can answer come from the snapshot until it
+        # is promoted, and everything else from the tree
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._tree is None and hasattr(FrozenBST, name):
+            return getattr(self._frozen, name)
+        return getattr(self._promote(), name)
+
+    def insert(self, value):
+        """Insert a value, promoting the snapshot to a BST first.
+        """
+        self._promote().insert(value)
+
+    def remove(self, value):
+        """Remove a value, promoting the snapshot to a BST first.
+        """
+        return self._promote().remove(value)
+
+    def __contains__(self, value):
+        return value in self._view()
+
+    def __iter__(self):
+        return iter(self._view())
+
+    def __reversed__(self):
+        return reversed(self._view())
+
+    def __len__(self):
+        return len(self._view())
+
+
+class IndexedBST:
+    """Ordered set (or multiset) pairing a BST with a hash index.
+
+    Membership checks go to a dictionary of value counts in O(1), while
+    anything that needs order (iteration, ranges, ranks) goes to the
+    tree.  Every change goes through both, so they always agree.
+    Values must be hashable as well as comparable.
+    """
+
+    def __init__(self, allow_dups=False, balanced=True):
+        """Create an empty indexed BST.
+
+        Args:
+            allow_dups (bool): allow the same value to be inserted more than once
+            balanced (bool): keep the tree balanced (on by default)
+        """
+        self._tree = BST(allow_dups=allow_dups, balanced=balanced)
+        # Value -> number of times it is in the tree
+        self._counts = {}
+        self.allow_dups = allow_dups
+
+    def insert(self, value):
+        """Insert a value into the tree and the index.
+        """
+        count = self._counts.get(value, 0)
+        if count and not self.allow_dups:
+            return
+        self._tree.insert(value)
+        self._counts[value] = count + 1
+
+    def remove(self, value):
+        """Remove one copy of a value if it is present.
+        """
+        count = self._counts.get(value, 0)
+        if not count:
+            return False
+        self._tree.remove(value)
+        self._forget(value, count)
+        return True
+
+    def pop_min(self):
+        """Remove and return the smallest value, see BST.pop_min.
+        """
+        value = self._tree.pop_min()
+        self._forget(value, self._counts[value])
+        return value
+
+    def pop_max(self):
+        """Remove and return the largest value, see BST.pop_max.
+        """
+        value = self._tree.pop_max()
+        self._forget(value, self._counts[value])
+        return value
+
+    def _forget(self, value, count):
+        """Lower the count of a value just removed from the tree.
+        """
+        if count == 1:
+            del self._counts[value]
+        else:
+            self._counts[value] = count - 1
+
+    def insert_many(self, values):
+        """Insert a batch of values, see BST.insert_many.
+
+        Returns:
+            int: number of values inserted
+        """
+        counts = self._counts
+        if self.allow_dups:
+            values = list(values)
+        else:
+            values = [value for value in set(values) if value not in counts]
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        return self._tree.insert_many(values)
+
+    def remove_many(self, values):
+        """Remove a batch of values, see BST.remove_many.
+
+        Returns:
+            int: number of values removed
+        """
+        counts = self._counts
+        present = []
+        for value in values:
+            count = counts.get(value, 0)
+            if count:
+                present.append(value)
+                if count == 1:
+                    del counts[value]
+                else:
+                    counts[value] = count - 1
+        return self._tree.remove_many(present)
+
+    def __contains__(self, value):
+        return value in self._counts
+
+    def contains_many(self, values):
+        """Check a batch of values against the index.
+
+        Returns:
+            list: one bool per value, True if it is present
+        """
+        counts = self._counts
+        return [value in counts for value in values]
+
+    def count(self, value):
+        """Number of times a value is present, in O(1).
+        """
+        return self._counts.get(value, 0)
+
+    def __iter__(self):
+        return iter(self._tree)
+
+    def __reversed__(self):
+        return reversed(self._tree)
+
+    def traverse_forward(self):
+        """Visit all values from smallest to largest.
+
+            Returns: values (list)
+        """
+        return self._tree.traverse_forward()
+
+    def traverse_reverse(self):
+        """Visit all values from largest to smallest.
+
+            Returns: values (list)
+        """
+        return self._tree.traverse_reverse()
+
+    def irange(self, lo=None, hi=None, reverse=False):
+        """Visit the values between 'lo' and 'hi', see BST.irange.
+        """
+        return self._tree.irange(lo, hi, reverse)
+
+    def minimum(self):
+        """Smallest value, or None if empty.
+        """
+        return self._tree.minimum()
+
+    def maximum(self):
+        """Largest value, or None if empty.
+        """
+        return self._tree.maximum()
+
+    def floor(self, value):
+        """Largest value less than or equal to 'value', or None.
+        """
+        return self._tree.floor(value)
+
+    def ceiling(self, value):
+        """Smallest value greater than or equal to 'value', or None.
+        """
+        return self._tree.ceiling(value)
+
+    def predecessor(self, value):
+        """Largest value strictly less than 'value', or None.
+        """
+        return self._tree.predecessor(value)
+
+    def successor(self, value):
+        """Smallest value strictly greater than 'value', or None.
+        """
+        return self._tree.successor(value)
+
+    def select(self, index):
+        """Value at a position in sorted order, see BST.select.
+        """
+        return self._tree.select(index)
+
+    def rank(self, value):
+        """Number of values strictly less than 'value'.
+        """
+        return self._tree.rank(value)
+
+    def count_range(self, lo=None, hi=None):
+        """Number of values between 'lo' and 'hi' (both inclusive).
+        """
+        return self._tree.count_range(lo, hi)
+
+    def seek(self, value=None):
+        """Cursor at the smallest value greater than or equal to 'value'.
+        """
+        return self._tree.seek(value)
+
+    def height(self):
+        """Height of the tree.
+        """
+        return self._tree.height()
+
+    def rebalance_tree(self):
+        """Rebalance the whole tree, see BST.rebalance_tree.
+        """
+        self._tree.rebalance_tree()
+
+    def freeze(self):
+        """Copy the values into an immutable FrozenBST, see BST.freeze.
+        """
+        return self._tree.freeze()
+
+    def validate(self):
+        """Check the tree (see BST.validate) and that the index matches it.
+        """
+        self._tree.validate()
+        counts = {}
+        for value in self._tree:
+            counts[value] = counts.get(value, 0) + 1
+        assert counts == self._counts, 'index does not match the tree'
+        return True
+
+    def __len__(self):
+        return len(self._tree)
+
+    @property
+    def size(self):
+        """Return the number of values.
+        """
+        return len(self._tree)
+
+    @property
+    def empty(self):
+        """Returns True if there are no values.
+        """
+        return self._tree.empty
+
+
+class ConcurrentBST(BST):
+    """Balanced BST for many reader threads and one or more writers.
+
+    Nodes that are reachable from a published root are never changed.
+    A write copies the nodes on the path it changes (path copying), and
+    then publishes the new root with a single assignment, so readers
+    never take a lock.  Every read starts from the root it sees first,
+    which makes each iterator, range or cursor a consistent snapshot
+    even while writers keep going.  Writers take turns on a lock.
+    """
+
+    def __init__(self, allow_dups=False, balanced=True, key=None):
+        if not balanced:
+            raise ValueError('ConcurrentBST is always balanced')
+        super().__init__(allow_dups=allow_dups, balanced=True, key=key)
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def from_sorted(cls, iterable, allow_dups=False, balanced=True, key=None):
+        return super().from_sorted(iterable, allow_dups=allow_dups, balanced=balanced, key=key)
+
+    @classmethod
+    def from_iterable(cls, iterable, presorted=False, allow_dups=False, balanced=True,
+                      key=None):
+        return super().from_iterable(iterable, presorted=presorted,
+                                     allow_dups=allow_dups, balanced=balanced, key=key)
+
+    def snapshot(self):
+        """Get an independent tree holding the current values in O(1).
+
+        The snapshot shares nodes with this tree, but changing either
+        one copies what it changes, so neither sees the other's writes.
+        """
+        root = self.root
+        tree = ConcurrentBST(allow_dups=self.allow_dups, key=self.key)
+        tree.root = root
+        tree._size = self._subtree_size(root)
+        return tree
+
+    @staticmethod
+    def _copy_node(node):
+        """Private copy of a node that can be changed before it is published.
+        """
+        copy = BST.Node(node.data, node.key)
+        copy.less_than = node.less_than
+        copy.greater_than = node.greater_than
+        copy.height = node.height
+        copy.size = node.size
+        copy.count = node.count
+        return copy
+
+    def _rotate_left(self, node):
+        # Rotations also change the child, which may still be shared
+        node = self._copy_node(node)
+        node.greater_than = self._copy_node(node.greater_than)
+        return super()._rotate_left(node)
+
+    def _rotate_right(self, node):
+        node = self._copy_node(node)
+        node.less_than = self._copy_node(node.less_than)
+        return super()._rotate_right(node)
+
+    def insert(self, value):
+        """Insert a value by publishing a copy of the changed path.
+        """
+        with self._write_lock:
+            self._insert_locked(value, self._key_of(value))
+
+    def _insert_locked(self, value, key):
+        root = self.root
+        if not self.allow_dups and self._contains(key, root):
+            return 0
+        self.root = self._insert_copy(root, value, key)
+        self._size += 1
+        return 1
+
+    def _insert_copy(self, node, data, key):
+        """Return a copy of the sub-tree at 'node' with 'data' added.
+        """
+        if node is None:
+            return BST.Node(data, key)
+        node = self._copy_node(node)
+        if key < node.key:
+            node.less_than = self._insert_copy(node.less_than, data, key)
+        elif key == node.key:
+            node.count += 1
+        else:
+            node.greater_than = self._insert_copy(node.greater_than, data, key)
+        return self._refresh(node)
+
+    def remove(self, value):
+        """Remove a value by publishing a copy of the changed path.
+
+        Returns:
+            bool: True if the value was found and removed
+        """
+        with self._write_lock:
+            return self._remove_locked(self._key_of(value)) == 1
+
+    def _pop_end(self, side, other_side):
+        """
+        Same as BST._pop_end (behind pop_min and pop_max), but publishes
+        a copy of the changed path.
+        """
+        with self._write_lock:
+            if self.root is None:
+                raise IndexError('pop from an empty BST')
+            node = self._extreme(self.root, side)
+            self._remove_locked(node.key)
+            return node.data
+
+    def _remove_locked(self, key):
+        root = self.root
+        if not self._contains(key, root):
+            return 0
+        self.root = self._remove_copy(root, key)
+        self._size -= 1
+        return 1
+
+    def _remove_copy(self, node, key):
+        """Return a copy of the sub-tree at 'node' with one value of 'key' taken out.
+
+        The value must be in the sub-tree.
+        """
+        if key < node.key:
+            node = self._copy_node(node)
+            node.less_than = self._remove_copy(node.less_than, key)
+        elif key > node.key:
+            node = self._copy_node(node)
+            node.greater_than = self._remove_copy(node.greater_than, key)
+        elif node.count > 1:
+            node = self._copy_node(node)
+            node.count -= 1
+        elif node.less_than is None:
+            return node.greater_than
+        elif node.greater_than is None:
+            return node.less_than
+        else:
+            # The largest node on the "less than" side takes its place
+            less_than, replacement = self._detach_max_copy(node.less_than)
+            greater_than = node.greater_than
+            node = self._copy_node(replacement)
+            node.less_than = less_than
+            node.greater_than = greater_than
+        return self._refresh(node)
+
+    def _detach_max_copy(self, node):
+        """
+        Returns:
+            tuple: (copy of the sub-tree without its largest node, that node)
+        """
+        if node.greater_than is None:
+            return (node.less_than, node)
+        node = self._copy_node(node)
+        node.greater_than, maximum = self._detach_max_copy(node.greater_than)
+        return (self._refresh(node), maximum)
+
+    def insert_many(self, values):
+        """Insert a batch of values, publishing after each one.
+
+        Returns:
+            int: number of values inserted
+        """
+        batch, keys = self._sorted_batch(values)
+        with self._write_lock:
+            return sum(self._insert_locked(value, key) for value, key in zip(batch, keys))
+
+    def remove_many(self, values):
+        """Remove a batch of values, publishing after each one.
+
+        Returns:
+            int: number of values removed
+        """
+        keys = sorted(values if self.key is None else map(self.key, values))
+        with self._write_lock:
+            return sum(self._remove_locked(key) for key in keys)
+
+    def rebalance_tree(self):
+        """Publish a rebuilt tree of minimal height made of new nodes.
+        """
+        with self._write_lock:
+            head, count = self._tree_to_vine(self.root)
+            self.root, _ = self._vine_to_tree(head, count)
+
+    def split(self, value):
+        """Split into the values below 'value' and the rest, like BST.split.
+
+        Only the path to 'value' is copied, so snapshots taken before
+        the split keep their values.
+        """
+        with self._write_lock:
+            return super().split(value)
+
+    @staticmethod
+    def join(less_than, greater_than):
+        """Join two trees like BST.join, copying the nodes it changes.
+        """
+        less_than._check_compatible(greater_than)
+        first, second = sorted((less_than, greater_than), key=id)
+        with first._write_lock, second._write_lock:
+            return BST.join(less_than, greater_than)
+
+    @staticmethod
+    def merge(first, second):
+        """Merge two trees like BST.merge, out of copies of their nodes.
+        """
+        first._check_compatible(second)
+        locks = sorted((first, second), key=id)
+        with locks[0]._write_lock, locks[1]._write_lock:
+            return BST.merge(first, second)
+
+    @staticmethod
+    def _own(node):
+        return ConcurrentBST._copy_node(node)
+
+    @staticmethod
+    def _tree_to_vine(node):
+        """
+        Copy the nodes of the sub-tree represented by 'node' in order
+        into a vine, leaving the sub-tree itself untouched.
+
+        Returns:
+            tuple: (smallest node of the vine, number of nodes)
+        """
+        head = None
+        tail = None
+        count = 0
+        stack = []
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.less_than
+                continue
+            node = stack.pop()
+            copy = BST.Node(node.data, node.key)
+            copy.count = node.count
+            if tail is None:
+                head = copy
+            else:
+                tail.greater_than = copy
+            tail = copy
+            count += 1
+            node = node.greater_than
+        return (head, count)
+
+    def __len__(self):
+        # The size kept in the root always matches the root a reader sees
+        return self._subtree_size(self.root)
+
+    @property
+    def size(self):
+        """Return the size of the BST.
+        """
+        return self._subtree_size(self.root)
+
+
+class InstrumentedBST(BST):
+    """BST that counts the work done by each insert, remove and lookup.
+
+    The counting lives in this subclass, so a plain BST pays nothing
+    for it.  Use InstrumentedBST in place of BST, or switch an existing
+    tree on and off with BST.instrument() and uninstrument().
+
+    The walks down the tree in insert, remove and lookups are
+    overridden with copies that count every comparison and every node
+    compared against, which is the depth reached by the search.  They
+    compare the keys exactly as BST does, so results never change.
+    Rotations and new nodes are counted by overriding the methods that
+    make them.
+    """
+
+    class Counts:
+        """Work done by one operation, or added up over many.
+        """
+
+        __slots__ = ('comparisons', 'visits', 'rotations', 'allocations')
+
+        def __init__(self):
+            self.comparisons = 0
+            self.visits = 0
+            self.rotations = 0
+            self.allocations = 0
+
+        def add(self, other):
+            self.comparisons += other.comparisons
+            self.visits += other.visits
+            self.rotations += other.rotations
+            self.allocations += other.allocations
+
+        def __repr__(self):
+            return (f'Counts(comparisons={self.comparisons}, visits={self.visits}, '
+                    f'rotations={self.rotations}, allocations={self.allocations})')
+
+    def __init__(self, allow_dups=False, balanced=False, key=None, callback=None):
+        """Create an empty instrumented BST.
+
+        Args:
+            callback (function): called as callback(operation, counts)
+                after every insert, remove and lookup, where operation
+                is 'insert', 'remove' or 'contains' and counts is the
+                InstrumentedBST.Counts of that operation alone
+        """
+        super().__init__(allow_dups=allow_dups, balanced=balanced, key=key)
+        self._start_counting(callback)
+
+    def _start_counting(self, callback):
+        self.callback = callback
+        self.totals = InstrumentedBST.Counts()
+        # Lookup depth -> number of operations that went that deep
+        self.depths = {}
+        # Where the counting goes between operations
+        self._current = self.totals
+
+    def reset(self):
+        """Zero all of the counters and the depth histogram.
+        """
+        self._start_counting(self.callback)
+
+    def uninstrument(self):
+        """Turn this tree back into a plain BST, dropping the counters.
+        """
+        del self.callback, self.totals, self.depths, self._current
+        self.__class__ = BST
+        return self
+
+    def _new_node(self, data, key):
+        self._current.allocations += 1
+        return BST.Node(data, key)
+
+    def _insert(self, data, key, node):
+        counts = self._current
+        path = []
+        while True:
+            path.append(node)
+            counts.visits += 1
+            counts.comparisons += 1
+            if key < node.key:
+                if node.less_than is None:
+                    node.less_than = self._new_node(data, key)
+                    break
+                node = node.less_than
+                continue
+            counts.comparisons += 1
+            if key == node.key:
+                if not self.allow_dups:
+                    return
+                node.count += 1
+                self._size += 1
+                for node in path:
+                    node.size += 1
+                return
+            if node.greater_than is None:
+                node.greater_than = self._new_node(data, key)
+                break
+            node = node.greater_than
+        self._size += 1
+        for node in path:
+            node.size += 1
+        self._retrace(path)
+
+    def _remove(self, key, node, parent):
+        counts = self._current
+        path = [] if parent is None else [parent]
+        while node is not None:
+            counts.visits += 1
+            counts.comparisons += 1
+            if node.key == key:
+                break
+            path.append(node)
+            counts.comparisons += 1
+            if key < node.key:
+                node = node.less_than
+            else:
+                node = node.greater_than
+        if node is None:
+            return False
+        self._unlink(node, path)
+        return True
+
+    def _contains(self, key, node):
+        counts = self._current
+        while node is not None:
+            counts.visits += 1
+            counts.comparisons += 1
+            if node.key == key:
+                return True
+            counts.comparisons += 1
+            if key < node.key:
+                node = node.less_than
+            else:
+                node = node.greater_than
+        return False
+
+    def _rotate_left(self, node):
+        self._current.rotations += 1
+        return super()._rotate_left(node)
+
+    def _rotate_right(self, node):
+        self._current.rotations += 1
+        return super()._rotate_right(node)
+
+    def insert(self, value):
+        self._current = InstrumentedBST.Counts()
+        try:
+            super().insert(value)
+        finally:
+            self._finish('insert')
+
+    def remove(self, value):
+        self._current = InstrumentedBST.Counts()
+        try:
+            return super().remove(value)
+        finally:
+            self._finish('remove')
+
+    def __contains__(self, value):
+        self._current = InstrumentedBST.Counts()
+        try:
+            return super().__contains__(value)
+        finally:
+            self._finish('contains')
+
+    def _finish(self, operation):
+        """Add the counts of the operation that just ended to the totals.
+        """
+        counts = self._current
+        self._current = self.totals
+        self.totals.add(counts)
+        self.depths[counts.visits] = self.depths.get(counts.visits, 0) + 1
+        if self.callback is not None:
+            self.callback(operation, counts)
+
+
+def implement_basic_bst_hash_tree():
+    """Implement a BST that contains hashes of some objects of your choice.
+    Add several hashes to the tree.
+    Print the tree height.
+    Remove at least one of the hashes in the tree.
+    List the number of items in the tree.
+    Print the tree height.
+    Print out each node in reverse order.
+    Finally, print out each node in order.
+
+    Remember that Python has the builtin hash() function.
+    """
+    hash_tree = IndexedBST()
+    fruits = ['apple', 'banana', 'cherry', 'durian', 'elderberry', 'fig', 'grape']
+    for fruit in fruits:
+        hash_tree.insert(hash(fruit))
+    print('Height:', hash_tree.height())
+
+    hash_tree.remove(hash('durian'))
+    print('Items:', len(hash_tree))
+    print('Height:', hash_tree.height())
+    print('Has durian:', hash('durian') in hash_tree)
+
+    print('Reverse:', hash_tree.traverse_reverse())
+    print('In order:', hash_tree.traverse_forward())
+
+
+# All tests are below this point
+
+if __name__ == '__main__':
+    # Name Search Tree Example
+    name_bst = BST()
+    name_bst.insert('Ronald')
+    name_bst.insert('Bruh')
+    name_bst.insert('Dylan')
+    name_bst.insert('Ana')
+    name_bst.insert('Victor')
+    name_bst.insert('Willard')
+    name_bst.insert('Thomas')
+
+    # True
+    print('Bruh' in name_bst)
+    assert 'Bruh' in name_bst
+
+    # ['Ana', 'Bruh', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
+    print(name_bst.traverse_forward())
+    assert name_bst.traverse_forward() == \
+        ['Ana', 'Bruh', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
+
+    name_bst.remove('Bruh')
+
+    # ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
+    print(name_bst.traverse_forward())
+    assert name_bst.traverse_forward() == ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
+
+    # 3
+    print(name_bst.height())
+    assert name_bst.height() == 3
+
+    # 6
+    print(name_bst.size)
+    assert name_bst.size == 6
+
+    name_bst.insert('Zester')
+    name_bst.insert('Zilliam')
+
+    # 4
+    name_bst.rebalance_tree()
+    print(name_bst.height())
+    assert name_bst.height() == 4
+
+    name_bst.remove('Zester')
+
+    # ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+    print(name_bst.traverse_forward())
+    assert name_bst.traverse_forward() ==  \
+        ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+
+    name_bst.remove('Ronald')
+
+    # ['Ana', 'Dylan', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+    print(name_bst.traverse_forward())
+    assert name_bst.traverse_forward() == ['Ana', 'Dylan', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+
+    name_bst.rebalance_tree()
+
+    # 3
+    print(name_bst.height())
+    assert name_bst.height() == 3
+    assert name_bst.traverse_forward() == ['Ana', 'Dylan', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+
+    # Rebalancing a degenerate tree
+    ordered_bst = BST(allow_dups=True)
+    for number in range(500):
+        ordered_bst.insert(number)
+    ordered_bst.insert(250)
+    assert ordered_bst.height() == 500
+    ordered_bst.rebalance_tree()
+    print(ordered_bst.height())
+    assert ordered_bst.height() == 9
+    assert ordered_bst.traverse_forward() == sorted(list(range(500)) + [250])
+
+    # Self-balancing (AVL) tree example
+    avl_bst = BST(balanced=True)
+    for number in range(1_000_000):
+        avl_bst.insert(number)
+
+    # An AVL tree is never taller than 1.44 * log2(n + 2)
+    print(avl_bst.height())
+    assert avl_bst.height() <= 1.4405 * math.log2(len(avl_bst) + 2) - 0.3277
+    assert len(avl_bst) == 1_000_000
+
+    avl_bst.insert(500)
+    assert len(avl_bst) == 1_000_000
+
+    for number in range(0, 100_000, 2):
+        avl_bst.remove(number)
+    assert len(avl_bst) == 950_000
+    assert avl_bst.height() <= 1.4405 * math.log2(len(avl_bst) + 2) - 0.3277
+    assert 1 in avl_bst and 2 not in avl_bst
+    assert avl_bst.traverse_forward()[:3] == [1, 3, 5]
+    assert avl_bst.validate()
+
+    # Degenerate trees are handled without recursion
+    deep_bst = BST()
+    for number in range(5_000):
+        deep_bst.insert(number)
+    assert deep_bst.height() == 5_000
+    assert 4_999 in deep_bst and 5_000 not in deep_bst
+    assert deep_bst.traverse_forward() == list(range(5_000))
+    assert deep_bst.traverse_reverse() == list(range(4_999, -1, -1))
+    deep_bst.remove(4_999)
+    deep_bst.remove(0)
+    assert deep_bst.height() == 4_998
+    assert len(deep_bst) == 4_998
+
+    # Duplicates are counted instead of stacked
+    hot_bst = BST(allow_dups=True)
+    for _ in range(100_000):
+        hot_bst.insert('hot')
+    hot_bst.insert('cold')
+    assert len(hot_bst) == 100_001 and hot_bst.height() == 2
+    hot_bst.remove('hot')
+    assert len(hot_bst) == 100_000 and 'hot' in hot_bst
+    assert hot_bst.traverse_forward()[:2] == ['cold', 'hot']
+    assert hot_bst.count_range('hot', 'hot') == 99_999
+    assert hot_bst.select(99_999) == 'hot'
+    assert hot_bst.seek('hot').count == 99_999
+
+    # Heights are cached, and validate() double checks them
+    assert name_bst.validate()
+    assert ordered_bst.validate()
+    assert deep_bst.validate()
+
+    # Range queries and cursors
+    # ['Dylan', 'Thomas', 'Victor']
+    print(list(name_bst.irange('Bruh', 'Victor')))
+    assert list(name_bst.irange('Bruh', 'Victor')) == ['Dylan', 'Thomas', 'Victor']
+    assert list(name_bst.irange('Bruh', 'Victor', reverse=True)) == ['Victor', 'Thomas', 'Dylan']
+    assert list(name_bst.irange(hi='B')) == ['Ana']
+    assert list(name_bst.irange(lo='Willard')) == ['Willard', 'Zilliam']
+    assert list(name_bst.irange('X', 'Y')) == []
+    assert name_bst.minimum() == 'Ana' and name_bst.maximum() == 'Zilliam'
+    assert name_bst.floor('Thomas') == 'Thomas' and name_bst.floor('Ronald') == 'Dylan'
+    assert name_bst.ceiling('Ronald') == 'Thomas' and name_bst.ceiling('Zz') is None
+    assert name_bst.predecessor('Thomas') == 'Dylan' and name_bst.predecessor('Ana') is None
+    assert name_bst.successor('Thomas') == 'Victor'
+
+    cursor = name_bst.seek('T')
+    assert cursor.value == 'Thomas'
+    assert cursor.next() == 'Victor'
+    assert cursor.prev() == 'Thomas'
+    assert cursor.prev() == 'Dylan'
+    assert list(cursor) == ['Dylan', 'Thomas', 'Victor', 'Willard', 'Zilliam']
+    assert not cursor.valid
+    assert list(name_bst.seek()) == name_bst.traverse_forward()
+    assert not name_bst.seek('Zz').valid
+
+    # Ranges stop early on a big tree
+    range_bst = BST.from_sorted(range(1_000_000))
+    assert list(itertools.islice(range_bst.irange(500_000), 3)) == [500_000, 500_001, 500_002]
+    cursor = range_bst.seek(999_998)
+    assert cursor.next() == 999_999 and cursor.next() is None
+
+    # Order statistics
+    # 'Thomas'
+    print(name_bst.select(2))
+    assert name_bst.select(2) == 'Thomas'
+    assert name_bst.select(-1) == 'Zilliam'
+    assert name_bst.rank('Thomas') == 2 and name_bst.rank('Zz') == 6
+    assert name_bst.count_range('B', 'W') == 3
+    assert name_bst.count_range(hi='Thomas') == 3
+    assert name_bst.count_range('Z', 'A') == 0
+    try:
+        name_bst.select(6)
+        assert False, 'select past the end should fail'
+    except IndexError:
+        pass
+    assert range_bst.select(123_456) == 123_456
+    assert range_bst.count_range(10, 19) == 10
+
+    # Bulk loading
+    loaded_bst = BST.from_sorted((number // 2 for number in range(2_000)), allow_dups=True)
+    # Each of the 1,000 distinct values counts its two copies
+    assert len(loaded_bst) == 2_000
+    assert loaded_bst.height() == 10
+    assert loaded_bst.traverse_forward() == [number // 2 for number in range(2_000)]
+    loaded_bst = BST.from_sorted(number // 2 for number in range(2_000))
+    assert len(loaded_bst) == 1_000
+    assert loaded_bst.traverse_forward() == list(range(1_000))
+    loaded_bst = BST.from_iterable(['Willard', 'Ana', 'Dylan', 'Ana'], balanced=True)
+    assert loaded_bst.traverse_forward() == ['Ana', 'Dylan', 'Willard']
+    loaded_bst.insert('Bruh')
+    assert loaded_bst.height() == 3
+    assert BST.from_sorted([]).empty
+    try:
+        BST.from_sorted([1, 3, 2])
+        assert False, 'unsorted input should be rejected'
+    except ValueError:
+        pass
+
+    # Batch operations
+    batch_bst = BST.from_sorted(range(0, 1_000, 2))
+    assert batch_bst.insert_many([5, 3, 3, 4, 1_001]) == 3
+    assert batch_bst.contains_many([5, 6, 7, 1_001]) == [True, True, False, True]
+    assert batch_bst.remove_many([5, 7, 0]) == 2
+    assert batch_bst.insert_many(range(1_000)) == 500
+    assert len(batch_bst) == 1_001
+    assert batch_bst.traverse_forward() == list(range(1_000)) + [1_001]
+    assert batch_bst.remove_many(range(0, 2_000, 3)) == 334
+    assert batch_bst.contains_many(range(6)) == [False, True, True, False, True, True]
+    assert batch_bst.validate()
+
+    # B-tree backend
+    name_btree = BTree(order=4)
+    for name in ['Ronald', 'Bruh', 'Dylan', 'Ana', 'Victor', 'Willard', 'Thomas', 'Ana']:
+        name_btree.insert(name)
+    name_btree.remove('Bruh')
+    assert name_btree.traverse_forward() == ['Ana', 'Dylan', 'Ronald', 'Thomas', 'Victor', 'Willard']
+    assert name_btree.traverse_reverse() == ['Willard', 'Victor', 'Thomas', 'Ronald', 'Dylan', 'Ana']
+    assert 'Dylan' in name_btree and 'Bruh' not in name_btree
+    assert len(name_btree) == 6 and name_btree.height() == 2
+
+    wide_btree = BTree()
+    for number in range(100_000):
+        wide_btree.insert(number)
+    # Ascending inserts leave every split node half full, so 100,000
+    # values take 4 levels of 32 children instead of 3 levels of 64
+    assert wide_btree.height() == 4
+    for number in range(0, 100_000, 2):
+        wide_btree.remove(number)
+    assert len(wide_btree) == 50_000
+    assert 99_999 in wide_btree and 50_000 not in wide_btree
+    assert list(itertools.islice(wide_btree, 3)) == [1, 3, 5]
+
+    # Hash-indexed ordered set
+    indexed_bst = IndexedBST(allow_dups=True)
+    for name in ['Ronald', 'Bruh', 'Dylan', 'Ana', 'Victor', 'Ana']:
+        indexed_bst.insert(name)
+    assert 'Ana' in indexed_bst and indexed_bst.count('Ana') == 2
+    indexed_bst.remove('Ana')
+    indexed_bst.remove('Zester')
+    assert indexed_bst.count('Ana') == 1 and len(indexed_bst) == 5
+    assert indexed_bst.insert_many(['Ana', 'Zester']) == 2
+    assert indexed_bst.remove_many(['Ana', 'Ana', 'Ana', 'Bruh']) == 3
+    assert 'Ana' not in indexed_bst
+    assert indexed_bst.contains_many(['Bruh', 'Dylan']) == [False, True]
+    assert indexed_bst.traverse_forward() == ['Dylan', 'Ronald', 'Victor', 'Zester']
+    assert list(indexed_bst.irange('E', 'W')) == ['Ronald', 'Victor']
+    assert indexed_bst.validate()
+    unique_bst = IndexedBST()
+    assert unique_bst.insert_many([3, 1, 3, 2]) == 3
+    unique_bst.insert(2)
+    assert unique_bst.traverse_forward() == [1, 2, 3] and unique_bst.validate()
+
+    # Removing reports whether anything was removed
+    expiry_bst = BST()
+    expiry_bst.insert(42)
+    assert expiry_bst.remove(7) is False and len(expiry_bst) == 1
+    assert expiry_bst.remove(42) is True and expiry_bst.empty and len(expiry_bst) == 0
+    assert expiry_bst.remove(42) is False and len(expiry_bst) == 0
+    # Draining the smallest values first
+    expiry_bst = BST.from_iterable([5, 3, 9, 3, 1], allow_dups=True, balanced=True)
+    assert [expiry_bst.pop_min() for _ in range(3)] == [1, 3, 3]
+    assert expiry_bst.pop_max() == 9 and expiry_bst.pop_max() == 5 and expiry_bst.validate()
+    try:
+        expiry_bst.pop_min()
+        assert False, 'popping an empty tree should fail'
+    except IndexError:
+        pass
+
+    # Records ordered by a key
+    people = [('Grace', 1906), ('Alan', 1912), ('Ada', 1815), ('Edsger', 1930)]
+    born_bst = BST(balanced=True, key=lambda person: person[1])
+    for person in people:
+        born_bst.insert(person)
+    assert [name for name, _ in born_bst] == ['Ada', 'Grace', 'Alan', 'Edsger']
+    assert born_bst.root.key == 1906
+    # Lookups compare by key, so any record with the same key matches
+    assert ('Someone', 1912) in born_bst and ('Alan', 1913) not in born_bst
+    born_bst.insert(('Turing', 1912))
+    assert len(born_bst) == 4 and born_bst.floor((None, 1920)) == ('Alan', 1912)
+    assert list(born_bst.irange((None, 1900), (None, 1920))) == [('Grace', 1906), ('Alan', 1912)]
+    born_bst.remove((None, 1815))
+    assert born_bst.minimum() == ('Grace', 1906) and born_bst.validate()
+    sorted_born = BST.from_iterable(people, key=lambda person: person[1])
+    assert list(sorted_born) == sorted(people, key=lambda person: person[1])
+    try:
+        BST(allow_dups=True, key=abs)
+        assert False, 'allow_dups with a key should be refused'
+    except ValueError:
+        pass
+
+    # Splitting, joining and merging
+    shard_bst = BST.from_sorted(range(1000), balanced=True)
+    low_bst, high_bst = shard_bst.split(600)
+    assert shard_bst.empty and len(low_bst) == 600 and len(high_bst) == 400
+    assert low_bst.maximum() == 599 and high_bst.minimum() == 600
+    assert low_bst.validate() and high_bst.validate()
+    # The smaller tree is hung off the side of the bigger one
+    small_bst = BST.from_sorted(range(2000, 2010), balanced=True)
+    joined_bst = BST.join(high_bst, small_bst)
+    assert list(joined_bst) == list(range(600, 1000)) + list(range(2000, 2010))
+    assert joined_bst.validate() and joined_bst.height() == 10
+    try:
+        BST.join(joined_bst, low_bst)
+        assert False, 'overlapping trees should not join'
+    except ValueError:
+        pass
+    merged_bst = BST.merge(low_bst, BST.from_iterable([5, 1_000_000, 599, -3], balanced=True))
+    assert len(merged_bst) == 602 and merged_bst.minimum() == -3 and merged_bst.validate()
+    counted_bst = BST.merge(BST.from_sorted([1, 2, 2], allow_dups=True),
+                            BST.from_sorted([2, 3], allow_dups=True))
+    assert list(counted_bst) == [1, 2, 2, 2, 3] and counted_bst.validate()
+
+    # Counting the work done by a tree
+    operations = []
+    counted_bst = InstrumentedBST(balanced=True,
+                                  callback=lambda operation, counts: operations.append(operation))
+    for value in range(15):
+        counted_bst.insert(value)
+    assert counted_bst.totals.allocations == 15 and counted_bst.totals.rotations == 11
+    counted_bst.reset()
+    assert 14 in counted_bst and 15 not in counted_bst
+    # A perfect tree of 15 values is 4 deep, and each step compares twice
+    assert counted_bst.depths == {4: 2} and counted_bst.totals.comparisons == 15
+    assert operations[-3:] == ['insert', 'contains', 'contains']
+    # A degenerate tree shows up as one deep lookup
+    chain_bst = BST()
+    for value in range(100):
+        chain_bst.insert(value)
+    chain_bst.instrument()
+    assert 99 in chain_bst and chain_bst.depths == {100: 1}
+    assert type(chain_bst.uninstrument()) is BST and 99 in chain_bst
+
+    # Counting never changes what a lookup finds, even for keys that
+    # only compare with their own type
+    class Ticket:
+        def __init__(self, number):
+            self.number = number
+
+        def __eq__(self, other):
+            return self.number == other.number
+
+        def __lt__(self, other):
+            return self.number < other.number
+
+    ticket_bst = BST()
+    for number in (5, 2, 8):
+        ticket_bst.insert(Ticket(number))
+    ticket_bst.instrument()
+    assert Ticket(8) in ticket_bst and Ticket(3) not in ticket_bst
+    assert ticket_bst.remove(Ticket(2)) and ticket_bst.totals.visits == 6
+    ticket_bst.insert(Ticket(1))
+    assert [ticket.number for ticket in ticket_bst] == [1, 5, 8]
+
+    # Concurrent readers and writers
+    concurrent_bst = ConcurrentBST.from_sorted(range(0, 20_000, 2))
+    frozen = concurrent_bst.snapshot()
+    reader_errors = []
+    writers_done = threading.Event()
+
+    def read_snapshots():
+        while not writers_done.is_set():
+            snapshot = concurrent_bst.snapshot()
+            values = list(snapshot)
+            if len(values) != len(snapshot) or values != sorted(set(values)):
+                reader_errors.append('inconsistent snapshot')
+            live = list(concurrent_bst.irange(5_000, 6_000))
+            if live != sorted(set(live)):
+                reader_errors.append('inconsistent iterator')
+
+    def write_values(seed):
+        rng = random.Random(seed)
+        for _ in range(5_000):
+            value = rng.randrange(20_000)
+            if rng.random() < 0.5:
+                concurrent_bst.insert(value)
+            else:
+                concurrent_bst.remove(value)
+
+    readers = [threading.Thread(target=read_snapshots) for _ in range(4)]
+    writers = [threading.Thread(target=write_values, args=(seed,)) for seed in range(2)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+    assert not reader_errors, reader_errors
+    assert concurrent_bst.validate()
+    # The snapshot taken before the writers started never changed
+    assert list(frozen) == list(range(0, 20_000, 2)) and frozen.validate()
+    frozen.insert(1)
+    assert 1 in frozen and len(frozen) == 10_001
+
+    # Freezing into a sorted array
+    frozen_bst = BST.from_sorted(range(0, 200, 2), allow_dups=True).freeze()
+    assert isinstance(frozen_bst._keys, array) and len(frozen_bst) == 100
+    assert 42 in frozen_bst and 43 not in frozen_bst
+    assert frozen_bst.contains_many([0, 1, 198, 199]) == [True, False, True, False]
+    assert list(frozen_bst.irange(10, 16)) == [10, 12, 14, 16]
+    assert list(frozen_bst.irange(10, 16, reverse=True)) == [16, 14, 12, 10]
+    assert frozen_bst.rank(11) == 6 and frozen_bst.count_range(11, 19) == 4
+    assert frozen_bst.floor(11) == 10 and frozen_bst.successor(198) is None
+    assert frozen_bst.select(-1) == 198 and frozen_bst.height() == 7
+    thawed_bst = frozen_bst.thaw(balanced=True)
+    thawed_bst.insert(42)
+    assert thawed_bst.count_range(42, 42) == 2 and thawed_bst.validate()
+    # Values that do not fit an integer array stay in a list
+    frozen_names = name_bst.freeze()
+    assert list(frozen_names) == name_bst.traverse_forward()
+    assert frozen_names.minimum() == name_bst.minimum() and 'Nobody' not in frozen_names
+    # Values that are integers of another type come back as that type
+    frozen_flags = BST.from_iterable([True, False]).freeze()
+    assert [type(flag) for flag in frozen_flags] == [bool, bool] and frozen_flags.select(1) is True
+
+    # Snapshots
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        snapshot_path = os.path.join(snapshot_dir, 'tree.bst')
+        snapshot_bst = BST.from_sorted(range(-500, 500, 5), balanced=True)
+        snapshot_bst.save(snapshot_path)
+        for use_mmap in (True, False):
+            mapped_bst = BST.load(snapshot_path, mmap=use_mmap)
+            assert len(mapped_bst) == 200 and mapped_bst.height() == 8
+            assert 495 in mapped_bst and -500 in mapped_bst and 3 not in mapped_bst
+            assert mapped_bst.traverse_forward() == list(range(-500, 500, 5))
+            assert list(mapped_bst.irange(-7, 12)) == [-5, 0, 5, 10]
+            assert list(mapped_bst.irange(-7, 12, reverse=True)) == [10, 5, 0, -5]
+            assert not mapped_bst.promoted
+            mapped_bst.insert(3)
+            assert mapped_bst.promoted and mapped_bst.balanced
+            assert 3 in mapped_bst and len(mapped_bst) == 201
+            assert mapped_bst.select(100) == 0
+        mapped_bst = BST.load(snapshot_path)
+        # Reads a FrozenBST has are answered in place; anything else promotes
+        assert mapped_bst.floor(3) == 0 and mapped_bst.rank(3) == 101
+        assert not mapped_bst.promoted
+        assert mapped_bst.seek(3).value == 5 and mapped_bst.promoted
+        mapped_bst.close()
+        # Readers of the snapshot keep going after it is written to
+        mapped_bst = BST.load(snapshot_path)
+        mapped_range = mapped_bst.irange(10, 20)
+        mapped_values = iter(mapped_bst)
+        assert next(mapped_values) == -500
+        mapped_bst.insert(7)
+        assert 7 in mapped_bst and mapped_bst.promoted
+        assert next(mapped_values) == -495 and list(mapped_range) == [10, 15, 20]
+        assert len(list(mapped_values)) == 198
+        # A save that fails part way leaves the last good snapshot alone
+        try:
+            BST.from_sorted([1, 2 ** 70]).save(snapshot_path)
+            assert False, 'a value over 64 bits should not be saved'
+        except OverflowError:
+            pass
+        assert len(BST.load(snapshot_path, mmap=False)) == 200
+        assert os.listdir(snapshot_dir) == ['tree.bst']
+        # However a snapshot is cut short, loading it fails the same way
+        with open(snapshot_path, 'rb') as snapshot:
+            snapshot_bytes = snapshot.read()
+        for cut in (3, 8, 13):
+            with open(snapshot_path, 'wb') as snapshot:
+                snapshot.write(snapshot_bytes[:-cut])
+            for use_mmap in (True, False):
+                try:
+                    BST.load(snapshot_path, mmap=use_mmap)
+                    assert False, 'a truncated snapshot should not load'
+                except ValueError as error:
+                    assert 'truncated' in str(error)
+
+    # Compact integer tree example
+    compact_bst = CompactBST()
+    for number in [50, 30, 70, 20, 40, 60, 80, 30]:
+        compact_bst.insert(number)
+    assert len(compact_bst) == 7
+    assert 40 in compact_bst and 45 not in compact_bst
+    compact_bst.remove(50)
+    compact_bst.remove(20)
+    compact_bst.remove(99)
+    assert compact_bst.traverse_forward() == [30, 40, 60, 70, 80]
+    assert compact_bst.traverse_reverse() == [80, 70, 60, 40, 30]
+    # Freed slots are reused instead of growing the arrays
+    compact_bst.insert(10)
+    try:
+        compact_bst.insert(2 ** 63)
+        assert False, 'a key over 64 bits should not fit'
+    except OverflowError:
+        pass
+    compact_bst.insert(90)
+    assert len(compact_bst._keys) == 7
+    compact_bst.rebalance_tree()
+    assert compact_bst.height() == 3
+    assert compact_bst.traverse_forward() == [10, 30, 40, 60, 70, 80, 90]
+
+    # Run challenge code
+    implement_basic_bst_hash_tree()
@@ -4,6 +4,10 @@
 # This example uses the deque structure to provide O(1) for both
 # enqueue and dequeue operations.
 from collections import deque
+from itertools import repeat, starmap
+from queue import Empty, Full
+import asyncio
+import threading
 
 class Queue:
     """Implementation of a queue using a "deque".
@@ -38,6 +42,43 @@ class Queue:
             return self.queue.popleft()
         return None
 
+    def enqueue_front(self, value):
+        """Adds a value to the front of the queue, ahead of everything in it.
+
+        Args:
+            value (any): added value
+        """
+        self.queue.appendleft(value)
+
+    def enqueue_many(self, values):
+        """Adds values to the end of the queue in one call.
+
+        Args:
+            values (iterable): added values, first to last
+        """
+        self.queue.extend(values)
+
+    def dequeue_many(self, count):
+        """Removes and returns up to 'count' values from the front of the queue.
+
+        The values are popped by the deque itself in a single call, not
+        one Python-level call per value.
+
+        Args:
+            count (int): most values to remove
+
+        Returns:
+            list: values, first to last (fewer than 'count' if the queue runs out)
+        """
+        if count < 0:
+            raise ValueError("'count' must be a non-negative number")
+        count = min(count, len(self.queue))
+        if count == len(self.queue):
+            values = list(self.queue)
+            self.queue.clear()
+            return values
+        return list(starmap(self.queue.popleft, repeat((), count)))
+
     def __str__(self):
         return self.queue.__str__()[6:-1]
 
@@ -58,61 +99,421 @@ class Queue:
         """
         return len(self.queue) == 0
 
-# Amusement park line example
+class BlockingQueue(Queue):
+    """Queue that can be shared between threads.
+
+    Consumers wait in get() until a value arrives instead of polling
+    dequeue(), and with a maxsize producers wait in put() until there
+    is room, which slows them down to the pace of the consumers.  The
+    waiting is done on condition variables, so a waiting thread uses
+    no CPU.  task_done() and join() let a producer wait until every
+    value has been handled, the same as queue.Queue.
+    """
+
+    def __init__(self, elements=None, maxsize=0):
+        """
+        Args:
+            elements (iterable): values the queue starts with
+            maxsize (int): most values the queue holds before put()
+                blocks, or 0 for no limit
+        """
+        super().__init__(elements)
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_tasks_done = threading.Condition(self._lock)
+        self._unfinished_tasks = len(self.queue)
+
+    def put(self, value, block=True, timeout=None):
+        """Add a value to the end of the queue, waiting for room if it is full.
+
+        Args:
+            value (any): added value
+            block (bool): wait for room instead of failing right away
+            timeout (float): most seconds to wait, or None to wait forever
+
+        Raises:
+            queue.Full: if there is still no room after waiting
+        """
+        with self._not_full:
+            if 0 < self.maxsize <= len(self.queue):
+                self._wait(self._not_full, lambda: len(self.queue) < self.maxsize,
+                           block, timeout, Full)
+            self.queue.append(value)
+            self._unfinished_tasks += 1
+            self._not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the value at the front, waiting for one if it is empty.
+
+        Args:
+            block (bool): wait for a value instead of failing right away
+            timeout (float): most seconds to wait, or None to wait forever
+
+        Raises:
+            queue.Empty: if there is still no value after waiting
 
-# Make a queue for a line with people in it
-ride_line = \
-    Queue(['Rider 1', 'Rider 2', 'Rider 3', 'Rider 4', 'Rider 5', 'Rider 6', 'Rider 7', 'Rider 8'])
+        Returns:
+            any: value
+        """
+        with self._not_empty:
+            if not self.queue:
+                self._wait(self._not_empty, lambda: self.queue, block, timeout, Empty)
+            value = self.queue.popleft()
+            self._not_full.notify()
+            return value
+
+    @staticmethod
+    def _wait(condition, ready, block, timeout, error):
+        """
+        Wait on 'condition' (whose lock is held) until 'ready()' is
+        true, raising 'error' if that does not happen in time.
+        """
+        if not block:
+            raise error
+        if timeout is not None and timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        if not condition.wait_for(ready, timeout):
+            raise error
+
+    def enqueue(self, value):
+        """Adds a value to the end of the queue, waiting for room if it is full.
+
+        Args:
+            value (any): added value
+        """
+        self.put(value)
+
+    def dequeue(self):
+        """Removes and returns the value at the front without waiting.
+
+        Returns:
+            any: value, or None if the queue is empty
+        """
+        try:
+            return self.get(block=False)
+        except Empty:
+            return None
+
+    def enqueue_front(self, value):
+        """Adds a value to the front of the queue, without waiting for room.
+
+        Args:
+            value (any): added value
+        """
+        with self._lock:
+            self.queue.appendleft(value)
+            self._unfinished_tasks += 1
+            self._not_empty.notify()
 
-# A new rider entered the end of the line
-ride_line.enqueue('Rider 9')
+    def enqueue_many(self, values):
+        """Adds values to the end of the queue, waiting for room as it fills up.
 
-# ['Rider 1', 'Rider 2', 'Rider 3', 'Rider 4', 'Rider 5', 'Rider 6', 'Rider 7', 'Rider 8', 'Rider 9']
-print(ride_line)
+        Values go in as many at a time as there is room for, each batch
+        under a single lock.
+
+        Args:
+            values (iterable): added values, first to last
+        """
+        values = list(values)
+        start = 0
+        while start < len(values):
+            with self._not_full:
+                room = len(values) - start
+                if self.maxsize > 0:
+                    if len(self.queue) >= self.maxsize:
+                        self._not_full.wait_for(lambda: len(self.queue) < self.maxsize)
+                    room = min(room, self.maxsize - len(self.queue))
+                self.queue.extend(values[start:start + room])
+                start += room
+                self._unfinished_tasks += room
+                self._not_empty.notify(room)
 
-# The ride finished a cycle and has 5 open seats
-ride_line.dequeue()
-ride_line.dequeue()
-ride_line.dequeue()
-ride_line.dequeue()
-ride_line.dequeue()
+    def dequeue_many(self, count):
+        """Removes and returns up to 'count' values from the front without waiting.
 
-# ['Rider 6', 'Rider 7', 'Rider 8', 'Rider 9']
-print(ride_line)
+        Returns:
+            list: values, first to last
+        """
+        with self._lock:
+            values = super().dequeue_many(count)
+            self._not_full.notify(len(values))
+            return values
 
-# A new rider entered the end of the line
-ride_line.enqueue('Rider 10')
+    def task_done(self):
+        """Mark a value taken out of the queue as handled.
 
-# The ride finished a cycle and has 5 open seats
-ride_line.dequeue()
-ride_line.dequeue()
-ride_line.dequeue()
-ride_line.dequeue()
-ride_line.dequeue()
+        Raises:
+            ValueError: if called more times than values were added
+        """
+        with self._all_tasks_done:
+            if self._unfinished_tasks <= 0:
+                raise ValueError('task_done() called too many times')
+            self._unfinished_tasks -= 1
+            if self._unfinished_tasks == 0:
+                self._all_tasks_done.notify_all()
 
-# []
-print(ride_line)
+    def join(self):
+        """Wait until every value added has been marked with task_done().
+        """
+        with self._all_tasks_done:
+            self._all_tasks_done.wait_for(lambda: self._unfinished_tasks == 0)
 
-# True
-print('Line empty:', ride_line.empty)
+    def __str__(self):
+        with self._lock:
+            return super().__str__()
 
-# Two new riders at the end of the line
-ride_line.enqueue('Rider 11')
-ride_line.enqueue('Rider 12')
+# Handed to consumers still waiting when an async queue is closed
+_CLOSED = object()
 
-# ['Rider 11', 'Rider 12']
-print(ride_line)
+class _AsyncWaiting:
+    """Waiting in line for an asyncio queue, the base of AsyncQueue and AsyncTieredQueue.
 
-# The ride finished a cycle and has 5 open seats
-ride_line.dequeue()
-ride_line.dequeue()
-# These should not return anything but still successfully run
-ride_line.dequeue()
-ride_line.dequeue()
-ride_line.dequeue()
+    Consumers waiting for a value and producers waiting for room each
+    line up first come, first served.  A new value is handed straight
+    to the consumer that has waited longest, and freed room goes to the
+    producer that has waited longest, so nobody can cut in line and
+    every wakeup is for exactly one waiter.
 
-# []
-print(ride_line)
+    The values are kept in a Queue or TieredQueue that is wrapped, not
+    subclassed, as its dequeue() returns a value where the async one
+    must be awaited.  They go in and out through its enqueue(value,
+    *args), enqueue_front(value, *args) and dequeue(), where args is
+    the priority of a TieredQueue and nothing for a Queue.
+    """
+
+    def __init__(self, queue, maxsize):
+        """
+        Args:
+            queue (Queue or TieredQueue): where the values are kept
+            maxsize (int): most values held before enqueue() waits,
+                or 0 for no limit
+        """
+        self._queue = queue
+        self.maxsize = maxsize
+        self.closed = False
+        # Futures of the waiting consumers
+        self._getters = deque()
+        # (future, value, args) of the waiting producers
+        self._putters = deque()
+
+    def _put_nowait(self, value, *args):
+        """
+        Hand the value to a waiting consumer or store it.
+
+        Returns:
+            bool: False if there was no room for it
+        """
+        if self.closed:
+            raise RuntimeError('enqueue on a closed queue')
+        while self._getters:
+            getter = self._getters.popleft()
+            # Consumers that gave up are skipped
+            if not getter.done():
+                getter.set_result((value, args))
+                return True
+        if 0 < self.maxsize <= len(self):
+            return False
+        self._queue.enqueue(value, *args)
+        return True
+
+    async def _put(self, value, *args):
+        if self._put_nowait(value, *args):
+            return
+        putter = asyncio.get_running_loop().create_future()
+        self._putters.append((putter, value, args))
+        # The value is stored by whoever frees up room for it
+        try:
+            await putter
+        except asyncio.CancelledError:
+            if putter.done() and not putter.cancelled() and putter.exception() is None:
+                # The value was let in just before giving up, so the
+                # enqueue has happened and is not undone
+                return
+            raise
+
+    def _get_nowait(self):
+        """
+        Take the next value out, letting the next waiting producer in.
+
+        Returns:
+            any: value, or _CLOSED if there is none
+        """
+        if not len(self):
+            return _CLOSED
+        value = self._queue.dequeue()
+        while self._putters:
+            putter, waiting_value, args = self._putters.popleft()
+            if not putter.done():
+                self._queue.enqueue(waiting_value, *args)
+                putter.set_result(None)
+                break
+        return value
+
+    async def _get(self):
+        """
+        Wait for the next value.
+
+        Returns:
+            any: value, or _CLOSED if the queue is closed and empty
+        """
+        if len(self) or self.closed:
+            return self._get_nowait()
+        getter = asyncio.get_running_loop().create_future()
+        self._getters.append(getter)
+        try:
+            handed = await getter
+        except asyncio.CancelledError:
+            if getter.done() and not getter.cancelled() and getter.result() is not _CLOSED:
+                # A value was handed over just before giving up, so it
+                # goes to the front of the line again
+                value, args = getter.result()
+                self._return_value(value, args)
+            raise
+        return handed if handed is _CLOSED else handed[0]
+
+    def _return_value(self, value, args):
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result((value, args))
+                return
+        self._queue.enqueue_front(value, *args)
+
+    async def _put_many(self, values, *args):
+        for value in values:
+            await self._put(value, *args)
+
+    async def _get_many(self, count):
+        """
+        Wait for a value, then take up to 'count' in all without waiting.
+        """
+        if count < 0:
+            raise ValueError("'count' must be a non-negative number")
+        if count == 0:
+            return []
+        first = await self._get()
+        if first is _CLOSED:
+            return []
+        values = [first]
+        while len(values) < count and len(self):
+            values.append(self._get_nowait())
+        return values
+
+    def close(self):
+        """Stop taking new values.
+
+        Values already in the queue can still be taken out, after which
+        dequeue() returns None and async iteration ends.  Producers still
+        waiting for room get the same RuntimeError as enqueuing after
+        the queue is closed, and their values are dropped.
+        """
+        self.closed = True
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(_CLOSED)
+        while self._putters:
+            putter, _, _ = self._putters.popleft()
+            if not putter.done():
+                putter.set_exception(RuntimeError('enqueue on a closed queue'))
+
+    def __str__(self):
+        return self._queue.__str__()
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def empty(self):
+        """Check if queue is empty
+
+        Returns:
+            bool: True if empty, False otherwise
+        """
+        return self._queue.empty
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        value = await self._get()
+        if value is _CLOSED:
+            raise StopAsyncIteration
+        return value
+
+class AsyncQueue(_AsyncWaiting):
+    """Queue for asyncio tasks.
+
+    dequeue() waits for a value instead of returning None, so a
+    consumer sleeps until something arrives and no polling is needed.
+    With a maxsize, enqueue() waits for room.  Waiting tasks are served
+    in the order they started waiting.  The queue can also be consumed
+    with 'async for', which ends once it has been closed and emptied.
+    Like asyncio.Queue, it is not thread-safe.
+    """
+
+    def __init__(self, elements=None, maxsize=0):
+        """
+        Args:
+            elements (iterable): values the queue starts with
+            maxsize (int): most values the queue holds before enqueue()
+                waits, or 0 for no limit
+        """
+        super().__init__(Queue(elements), maxsize)
+
+    async def enqueue(self, value):
+        """Adds a value to the end of the queue, waiting for room if it is full.
+
+        Args:
+            value (any): added value
+        """
+        await self._put(value)
+
+    def enqueue_nowait(self, value):
+        """Adds a value to the end of the queue without waiting.
+
+        Raises:
+            queue.Full: if the queue is full
+        """
+        if not self._put_nowait(value):
+            raise Full
+
+    async def dequeue(self):
+        """Removes and returns the value at the front, waiting for one if it is empty.
+
+        Returns:
+            any: value, or None once the queue is closed and empty
+        """
+        value = await self._get()
+        return None if value is _CLOSED else value
+
+    async def enqueue_many(self, values):
+        """Adds values to the end of the queue, waiting for room as it fills up.
+
+        Args:
+            values (iterable): added values, first to last
+        """
+        await self._put_many(values)
+
+    async def dequeue_many(self, count):
+        """Waits for a value, then removes up to 'count' values in all.
+
+        Returns:
+            list: values, first to last, or an empty list once the
+            queue is closed and empty
+        """
+        return await self._get_many(count)
+
+    def dequeue_nowait(self):
+        """Removes and returns the value at the front without waiting.
+
+        Returns:
+            any: value, or None if the queue is empty
+        """
+        value = self._get_nowait()
+        return None if value is _CLOSED else value
 
 class TieredQueue:
     """The Playstation 5 is a widely sought after game console.
@@ -120,35 +521,114 @@ class TieredQueue:
     give priority to members over others. In this challenge,
     you will use multiple "tiered" queues that supersede others
     whenever there are any customers in that queue.
+
+    The number of tiers is set when the queue is made.  Which tiers
+    have customers waiting is kept as the bits of one integer, so
+    finding the highest priority customer takes the same time with
+    hundreds of tiers as with four.  The total number of customers and
+    the number in each tier are counted as they come and go, so len(),
+    empty and depths[tier] never add up the tiers.  Tiers should only
+    be changed through the TieredQueue so the bits and counts stay right.
     """
 
-    def __init__(self):
-        self.platinum_members = Queue()
-        self.gold_members = Queue()
-        self.bronze_members = Queue()
-        self.non_members = Queue()
+    def __init__(self, tiers:int=4):
+        """
+        Args:
+            tiers (int): number of tiers, including the last one for
+                non-members
+        """
+        if tiers < 1:
+            raise ValueError("'tiers' must be a positive number")
+        self.tiers = [Queue() for _ in range(tiers)]
+        # Bit i is set while self.tiers[i] has customers in it
+        self._waiting = 0
+        # Customers in all tiers, and in each tier
+        self.size = 0
+        self.depths = [0] * tiers
+
+    # The default four tiers by name.  The member tiers only exist with at
+    # least four tiers, but the last tier is always for non-members
+    @property
+    def platinum_members(self):
+        """Queue of priority 1 customers.
+        """
+        return self._member_tier(1)
+
+    @property
+    def gold_members(self):
+        """Queue of priority 2 customers.
+        """
+        return self._member_tier(2)
+
+    @property
+    def bronze_members(self):
+        """Queue of priority 3 customers.
+        """
+        return self._member_tier(3)
+
+    @property
+    def non_members(self):
+        """Queue of customers of any other priority.
+        """
+        return self.tiers[-1]
+
+    def _member_tier(self, priority):
+        if len(self.tiers) < 4:
+            raise AttributeError(f'membership tiers need at least 4 tiers, '
+                                 f'this queue has {len(self.tiers)}')
+        return self.tiers[priority - 1]
 
     # Challenge: enqueue customers based on priority
     def enqueue(self, customer:str, priority:int=0):
         """Add customer to a queue based on membership.
 
+        With the default four tiers:
         Priority 1: Platinum Members
         Priority 2: Gold Members
         Priority 3: Bronze Members
         Any other: Non-Member
 
+        With N tiers, priorities 1 to N - 1 each have their own tier
+        and any other priority goes in the last one.
+
         Args:
             customer (str): customer name
             priority (int): customer membership level
         """
-        if priority == 1:
-            self.platinum_members.enqueue(customer)
-        elif priority == 2:
-            self.gold_members.enqueue(customer)
-        elif priority == 3:
-            self.bronze_members.enqueue(customer)
-        else:
-            self.non_members.enqueue(customer)
+        index = self._index(priority)
+        self.tiers[index].queue.append(customer)
+        self._waiting |= 1 << index
+        self.depths[index] += 1
+        self.size += 1
+
+    def enqueue_front(self, customer:str, priority:int=0):
+        """Put a customer back at the front of their tier, ahead of
+        everyone waiting in it.
+
+        Args:
+            customer (str): customer name
+            priority (int): customer membership level, see enqueue
+        """
+        index = self._index(priority)
+        self.tiers[index].queue.appendleft(customer)
+        self._waiting |= 1 << index
+        self.depths[index] += 1
+        self.size += 1
+
+    def _index(self, priority):
+        """The number of the tier that customers of a priority wait in.
+        """
+        if 1 <= priority < len(self.tiers):
+            return priority - 1
+        return len(self.tiers) - 1
+
+    def _first_waiting(self):
+        """The number of the highest priority tier with customers in it.
+
+        The lowest set bit of the waiting bits is the highest priority
+        tier, and 'bits & -bits' keeps only that bit.
+        """
+        return (self._waiting & -self._waiting).bit_length() - 1
 
     # Challenge: dequeue customers based on priority
     def dequeue(self):
@@ -163,37 +643,71 @@ class TieredQueue:
         always take precedence over the lower priorities.
 
         Returns:
-            str: customer from respective queue
+            str: customer from respective queue, or None if there are none
+        """
+        if not self._waiting:
+            return None
+        index = self._first_waiting()
+        customer = self.tiers[index].queue.popleft()
+        self.size -= 1
+        self.depths[index] -= 1
+        if not self.depths[index]:
+            self._waiting ^= 1 << index
+        return customer
+
+    def enqueue_many(self, customers, priority:int=0):
+        """Add customers of the same membership level in one call.
+
+        Args:
+            customers (iterable): customer names, first to last
+            priority (int): customer membership level, see enqueue
         """
-        if not self.platinum_members.empty:
-            return self.platinum_members.dequeue()
-        if not self.gold_members.empty:
-            return self.gold_members.dequeue()
-        if not self.bronze_members.empty:
-            return self.bronze_members.dequeue()
-        return self.non_members.dequeue()
+        index = self._index(priority)
+        tier = self.tiers[index]
+        try:
+            tier.enqueue_many(customers)
+        finally:
+            # Customers added before 'customers' raised are still counted
+            added = len(tier) - self.depths[index]
+            if added:
+                self._waiting |= 1 << index
+                self.depths[index] += added
+                self.size += added
+
+    def dequeue_many(self, count):
+        """Remove up to 'count' customers in priority order in one call.
+
+        Each tier is drained in bulk, highest priority first, until
+        'count' customers are taken or every tier is empty.
+
+        Args:
+            count (int): most customers to remove
+
+        Returns:
+            list: customers in the order they are served
+        """
+        if count < 0:
+            raise ValueError("'count' must be a non-negative number")
+        customers = []
+        while self._waiting and len(customers) < count:
+            index = self._first_waiting()
+            taken = self.tiers[index].dequeue_many(count - len(customers))
+            customers.extend(taken)
+            self.size -= len(taken)
+            self.depths[index] -= len(taken)
+            if not self.depths[index]:
+                self._waiting ^= 1 << index
+        return customers
 
     def __str__(self):
         """All combined queues represented in order.
         """
-        plat = self.platinum_members.__str__()[1:-1] + ', '
-        if plat == ', ':
-            plat = ''
-        gold = self.gold_members.__str__()[1:-1] + ', '
-        if gold == ', ':
-            gold = ''
-        bronze = self.bronze_members.__str__()[1:-1] + ', '
-        if bronze == ', ':
-            bronze = ''
-        others = self.non_members.__str__()[1:-1]
-
-        return f'[{plat}{gold}{bronze}{others}]'
+        return '[' + ', '.join(tier.__str__()[1:-1] for tier in self.tiers if len(tier)) + ']'
 
     def __len__(self):
         """Combined length of all queues
         """
-        return len(self.platinum_members) + len(self.gold_members) + \
-            len(self.bronze_members) + len(self.non_members)
+        return self.size
 
     @property
     def empty(self):
@@ -202,86 +716,405 @@ class TieredQueue:
         Returns:
             bool: True if empty, False otherwise
         """
-        return self.__len__() == 0
-
-# Tests
-
-playstation_backorders = TieredQueue()
-# This is just to see who has at least one Playstation 5.
-# Sets are covered more in depth in the next lesson.
-have_playstations = set()
-
-playstation_backorders.enqueue('Jeremy', 2)
-playstation_backorders.enqueue('Bode', 1)
-playstation_backorders.enqueue('Charles', 1)
-playstation_backorders.enqueue('Felica', 2)
-playstation_backorders.enqueue('Dilly', 2)
-playstation_backorders.enqueue('Jacobo')
-playstation_backorders.enqueue('Carcinogen')
-playstation_backorders.enqueue('Leety', 3)
-playstation_backorders.enqueue('Lilee', 3)
-playstation_backorders.enqueue('Kentisha', 2)
-playstation_backorders.enqueue('Robbalobbadoo', 1)
-
-# ['Bode', 'Charles', 'Robbalobbadoo', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']
-print(playstation_backorders)
-assert playstation_backorders.__str__() == \
-    "['Bode', 'Charles', 'Robbalobbadoo', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']"
-
-# Orders became available
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-
-# Order doesn't matter
-# {'Charles', 'Robbalobbadoo', 'Bode'}
-print(have_playstations)
-
-# Bode's back for another
-playstation_backorders.enqueue('Bode', 1)
-
-# ['Bode', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']
-print(playstation_backorders)
-assert playstation_backorders.__str__() == \
-    "['Bode', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']"
-
-# Large batch of orders became available
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-
-# ['Jacobo', 'Carcinogen']
-print(playstation_backorders)
-assert playstation_backorders.__str__() == "['Jacobo', 'Carcinogen']"
-
-# Order doesn't matter
-# {'Charles', 'Kentisha', 'Bode', 'Felica', 'Lilee', 'Dilly', 'Jeremy', 'Leety', 'Robbalobbadoo'}
-print(have_playstations)
-
-# Bode's back for yet another
-playstation_backorders.enqueue('Bode', 1)
-
-# Only one available
-have_playstations.add(playstation_backorders.dequeue())
-
-# ['Jacobo', 'Carcinogen']
-print(playstation_backorders)
-assert playstation_backorders.__str__() == "['Jacobo', 'Carcinogen']"
-
-# Large batch of orders became available
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-have_playstations.add(playstation_backorders.dequeue())
-
-# []
-print(playstation_backorders)
-print('No backorders:', playstation_backorders.empty)
-assert playstation_backorders.empty
+        return not self.size
+
+class AsyncTieredQueue(_AsyncWaiting):
+    """TieredQueue for asyncio tasks.
+
+    A consumer waiting in dequeue() wakes as soon as a customer of any
+    tier arrives, and higher tiers still go first.  With a maxsize,
+    enqueue() waits while that many customers are waiting across all
+    tiers.  Like AsyncQueue, waiting tasks are served in order and it
+    can be consumed with 'async for' until closed.
+    """
+
+    def __init__(self, tiers=4, maxsize=0):
+        """
+        Args:
+            tiers (int): number of tiers, see TieredQueue
+            maxsize (int): most customers held before enqueue() waits,
+                or 0 for no limit
+        """
+        super().__init__(TieredQueue(tiers), maxsize)
+
+    async def enqueue(self, customer:str, priority:int=0):
+        """Add customer to a queue based on membership, waiting for room if it is full.
+
+        Args:
+            customer (str): customer name
+            priority (int): customer membership level, see TieredQueue.enqueue
+        """
+        await self._put(customer, priority)
+
+    def enqueue_nowait(self, customer:str, priority:int=0):
+        """Add customer to a queue based on membership without waiting.
+
+        Raises:
+            queue.Full: if the queue is full
+        """
+        if not self._put_nowait(customer, priority):
+            raise Full
+
+    async def dequeue(self):
+        """Remove the customer with the highest priority, waiting for one if there are none.
+
+        Returns:
+            str: customer, or None once the queue is closed and empty
+        """
+        customer = await self._get()
+        return None if customer is _CLOSED else customer
+
+    async def enqueue_many(self, customers, priority:int=0):
+        """Add customers of one membership level, waiting for room as it fills up.
+        """
+        await self._put_many(customers, priority)
+
+    async def dequeue_many(self, count):
+        """Wait for a customer, then remove up to 'count' in priority order.
+
+        Returns:
+            list: customers, or an empty list once the queue is closed and empty
+        """
+        return await self._get_many(count)
+
+    def dequeue_nowait(self):
+        """Remove the customer with the highest priority without waiting.
+
+        Returns:
+            str: customer, or None if there are none
+        """
+        customer = self._get_nowait()
+        return None if customer is _CLOSED else customer
+
+if __name__ == '__main__':
+    # Amusement park line example
+
+    # Make a queue for a line with people in it
+    ride_line = \
+        Queue(['Rider 1', 'Rider 2', 'Rider 3', 'Rider 4', 'Rider 5', 'Rider 6', 'Rider 7', 'Rider 8'])
+
+    # A new rider entered the end of the line
+    ride_line.enqueue('Rider 9')
+
+    # ['Rider 1', 'Rider 2', 'Rider 3', 'Rider 4', 'Rider 5', 'Rider 6', 'Rider 7', 'Rider 8', 'Rider 9']
+    print(ride_line)
+
+    # The ride finished a cycle and has 5 open seats
+    ride_line.dequeue()
+    ride_line.dequeue()
+    ride_line.dequeue()
+    ride_line.dequeue()
+    ride_line.dequeue()
+
+    # ['Rider 6', 'Rider 7', 'Rider 8', 'Rider 9']
+    print(ride_line)
+
+    # A new rider entered the end of the line
+    ride_line.enqueue('Rider 10')
+
+    # The ride finished a cycle and has 5 open seats
+    ride_line.dequeue()
+    ride_line.dequeue()
+    ride_line.dequeue()
+    ride_line.dequeue()
+    ride_line.dequeue()
+
+    # []
+    print(ride_line)
+
+    # True
+    print('Line empty:', ride_line.empty)
+
+    # Two new riders at the end of the line
+    ride_line.enqueue('Rider 11')
+    ride_line.enqueue('Rider 12')
+
+    # ['Rider 11', 'Rider 12']
+    print(ride_line)
+
+    # The ride finished a cycle and has 5 open seats
+    ride_line.dequeue()
+    ride_line.dequeue()
+    # These should not return anything but still successfully run
+    ride_line.dequeue()
+    ride_line.dequeue()
+    ride_line.dequeue()
+
+    # []
+    print(ride_line)
+
+    # Tests
+
+    playstation_backorders = TieredQueue()
+    # This is just to see who has at least one Playstation 5.
+    # Sets are covered more in depth in the next lesson.
+    have_playstations = set()
+
+    playstation_backorders.enqueue('Jeremy', 2)
+    playstation_backorders.enqueue('Bode', 1)
+    playstation_backorders.enqueue('Charles', 1)
+    playstation_backorders.enqueue('Felica', 2)
+    playstation_backorders.enqueue('Dilly', 2)
+    playstation_backorders.enqueue('Jacobo')
+    playstation_backorders.enqueue('Carcinogen')
+    playstation_backorders.enqueue('Leety', 3)
+    playstation_backorders.enqueue('Lilee', 3)
+    playstation_backorders.enqueue('Kentisha', 2)
+    playstation_backorders.enqueue('Robbalobbadoo', 1)
+
+    # ['Bode', 'Charles', 'Robbalobbadoo', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']
+    print(playstation_backorders)
+    assert playstation_backorders.__str__() == \
+        "['Bode', 'Charles', 'Robbalobbadoo', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']"
+
+    # Orders became available
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+
+    # Order doesn't matter
+    # {'Charles', 'Robbalobbadoo', 'Bode'}
+    print(have_playstations)
+
+    # Bode's back for another
+    playstation_backorders.enqueue('Bode', 1)
+
+    # ['Bode', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']
+    print(playstation_backorders)
+    assert playstation_backorders.__str__() == \
+        "['Bode', 'Jeremy', 'Felica', 'Dilly', 'Kentisha', 'Leety', 'Lilee', 'Jacobo', 'Carcinogen']"
+
+    # Large batch of orders became available
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+
+    # ['Jacobo', 'Carcinogen']
+    print(playstation_backorders)
+    assert playstation_backorders.__str__() == "['Jacobo', 'Carcinogen']"
+
+    # Order doesn't matter
+    # {'Charles', 'Kentisha', 'Bode', 'Felica', 'Lilee', 'Dilly', 'Jeremy', 'Leety', 'Robbalobbadoo'}
+    print(have_playstations)
+
+    # Bode's back for yet another
+    playstation_backorders.enqueue('Bode', 1)
+
+    # Only one available
+    have_playstations.add(playstation_backorders.dequeue())
+
+    # ['Jacobo', 'Carcinogen']
+    print(playstation_backorders)
+    assert playstation_backorders.__str__() == "['Jacobo', 'Carcinogen']"
+
+    # Large batch of orders became available
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+    have_playstations.add(playstation_backorders.dequeue())
+
+    # []
+    print(playstation_backorders)
+    print('No backorders:', playstation_backorders.empty)
+    assert playstation_backorders.empty
+
+    # Whole batches of customers and orders at once
+    playstation_backorders.enqueue_many(['Jacobo', 'Carcinogen'])
+    playstation_backorders.enqueue_many(['Jeremy', 'Felica'], 2)
+    playstation_backorders.enqueue_many(['Bode', 'Charles'], 1)
+    assert playstation_backorders.dequeue_many(3) == ['Bode', 'Charles', 'Jeremy']
+    assert playstation_backorders.dequeue_many(0) == []
+    assert playstation_backorders.dequeue_many(10) == ['Felica', 'Jacobo', 'Carcinogen']
+    assert playstation_backorders.dequeue_many(10) == [] and playstation_backorders.empty
+    ride_line.enqueue_many(f'Rider {number}' for number in range(13, 20))
+    assert ride_line.dequeue_many(5) == [f'Rider {number}' for number in range(13, 18)]
+    assert ride_line.dequeue_many(5) == ['Rider 18', 'Rider 19'] and ride_line.empty
+
+    # Any number of tiers, each first come, first served
+    store_line = TieredQueue(300)
+    for priority in range(300, 0, -1):
+        store_line.enqueue(f'Customer {priority}a', priority)
+        store_line.enqueue(f'Customer {priority}b', priority)
+    store_line.enqueue('Walk-in', 0)
+    assert store_line.dequeue() == 'Customer 1a' and store_line.dequeue() == 'Customer 1b'
+    assert store_line.dequeue_many(3) == ['Customer 2a', 'Customer 2b', 'Customer 3a']
+    # 300 is past the numbered tiers, so it shares the last tier with the walk-in
+    served = store_line.dequeue_many(len(store_line))
+    assert served[-5:] == ['Customer 299a', 'Customer 299b', 'Customer 300a', 'Customer 300b',
+                           'Walk-in']
+    assert served[0] == 'Customer 3b' and store_line.empty and store_line.dequeue() is None
+    assert store_line.bronze_members is store_line.tiers[2]
+    store_line.enqueue('Customer 7b', 7)
+    store_line.enqueue_front('Customer 7a', 7)
+    assert store_line.depths[6] == 2 and store_line.dequeue_many(2) == ['Customer 7a', 'Customer 7b']
+    # Fewer than four tiers have no member tiers, only the last one
+    assert not hasattr(TieredQueue(2), 'bronze_members')
+    assert TieredQueue(1).non_members.empty and not hasattr(TieredQueue(1), 'platinum_members')
+    store_line.enqueue_many(['Customer 5a', 'Customer 5b'], 5)
+    store_line.enqueue('Walk-in')
+    assert store_line.depths[4] == 2 and store_line.depths[-1] == 1 and len(store_line) == 3
+    store_line.dequeue_many(2)
+    assert store_line.depths[4] == 0 and store_line.size == 1
+    assert store_line.depths == [len(tier) for tier in store_line.tiers]
+
+    def arrivals_until_closing():
+        yield 'Customer 6a'
+        yield 'Customer 6b'
+        raise RuntimeError('store closed')
+
+    try:
+        store_line.enqueue_many(arrivals_until_closing(), 6)
+        assert False, 'the arrivals should have stopped'
+    except RuntimeError:
+        pass
+    # The customers who got in before are counted and served
+    assert store_line.depths[5] == 2 and len(store_line) == 3
+    assert store_line.dequeue_many(3) == ['Customer 6a', 'Customer 6b', 'Walk-in']
+
+    # Blocking queue shared between threads
+    order_line = BlockingQueue(maxsize=2)
+    order_line.put('Order 1')
+    order_line.put('Order 2')
+    # Full, so a producer has to wait (here only briefly) for room
+    try:
+        order_line.put('Order 3', timeout=0.01)
+        assert False, 'a full queue should not take more'
+    except Full:
+        pass
+    assert order_line.get() == 'Order 1' and order_line.dequeue() == 'Order 2'
+    # Empty, so a consumer waits instead of getting None
+    try:
+        order_line.get(timeout=0.01)
+        assert False, 'an empty queue should have nothing to get'
+    except Empty:
+        pass
+    assert order_line.dequeue() is None
+    order_line.task_done()
+    order_line.task_done()
+
+    fulfilled = []
+
+    def fulfill_orders():
+        while True:
+            order = order_line.get()
+            if order is not None:
+                fulfilled.append(order)
+            order_line.task_done()
+            if order is None:
+                break
+
+    workers = [threading.Thread(target=fulfill_orders) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for number in range(300):
+        order_line.put(f'Order {number}')
+    order_line.join()
+    assert sorted(fulfilled) == sorted(f'Order {number}' for number in range(300))
+    for worker in workers:
+        order_line.put(None)
+    for worker in workers:
+        worker.join()
+    assert order_line.empty
+
+    # A batch bigger than the queue goes in as room frees up
+    batch_taker = threading.Thread(
+        target=lambda: fulfilled.extend(order_line.get() for _ in range(5)))
+    batch_taker.start()
+    order_line.enqueue_many(f'Batch {number}' for number in range(7))
+    batch_taker.join()
+    assert fulfilled[-5:] == [f'Batch {number}' for number in range(5)]
+    assert order_line.dequeue_many(5) == ['Batch 5', 'Batch 6'] and order_line.empty
+    order_line.put('Order 301')
+    order_line.enqueue_front('Order 300')
+    assert order_line.dequeue_many(2) == ['Order 300', 'Order 301']
+
+    # Queues for asyncio
+    async def run_order_intake():
+        intake = AsyncTieredQueue(maxsize=4)
+        served = []
+
+        async def serve_customers():
+            # Wakes up whenever a customer of any tier arrives
+            async for customer in intake:
+                served.append(customer)
+
+        server = asyncio.create_task(serve_customers())
+        await intake.enqueue('Jacobo')
+        await asyncio.sleep(0)
+        assert served == ['Jacobo']
+        intake.close()
+        await server
+        # Nobody is being served, so the line fills up and waits for room
+        intake = AsyncTieredQueue(maxsize=2)
+        await intake.enqueue('Carcinogen')
+        await intake.enqueue('Bode', 1)
+        late = asyncio.create_task(intake.enqueue('Leety', 3))
+        await asyncio.sleep(0)
+        assert not late.done() and len(intake) == 2
+        assert await intake.dequeue() == 'Bode'
+        await late
+        assert str(intake) == "['Leety', 'Carcinogen']"
+
+        # Waiting consumers are served in the order they started waiting
+        line = AsyncQueue()
+        riders = []
+
+        async def ride(rider):
+            riders.append((rider, await line.dequeue()))
+
+        waiting = [asyncio.create_task(ride(rider)) for rider in ('Rider 1', 'Rider 2')]
+        await asyncio.sleep(0)
+        await line.enqueue('Seat A')
+        await line.enqueue('Seat B')
+        await asyncio.gather(*waiting)
+        assert riders == [('Rider 1', 'Seat A'), ('Rider 2', 'Seat B')]
+        # A producer given up on after its value was let in still counts as enqueued
+        line = AsyncQueue(maxsize=1)
+        await line.enqueue('Seat X')
+        late = asyncio.create_task(line.enqueue('Seat Y'))
+        await asyncio.sleep(0)
+        assert line.dequeue_nowait() == 'Seat X'
+        late.cancel()
+        await late
+        assert str(line) == "['Seat Y']" and line.dequeue_nowait() == 'Seat Y'
+
+        # A batch consumer waits for the first value, then takes what is there
+        batch = asyncio.create_task(line.dequeue_many(3))
+        await asyncio.sleep(0)
+        await line.enqueue_many(['Seat C', 'Seat D', 'Seat E', 'Seat F'])
+        assert await batch == ['Seat C', 'Seat D', 'Seat E']
+        assert await line.dequeue_many(3) == ['Seat F']
+        line.close()
+        assert await line.dequeue() is None
+        assert await line.dequeue_many(3) == []
+        # Producers waiting for room are turned away when the queue closes
+        line = AsyncQueue(['Seat G'], maxsize=1)
+        late = asyncio.create_task(line.enqueue('Seat H'))
+        await asyncio.sleep(0)
+        line.close()
+        try:
+            await late
+            assert False, 'a closed queue should not take more'
+        except RuntimeError:
+            pass
+        assert line.dequeue_nowait() == 'Seat G' and line.empty
+        # The line is full, so the batch goes in one customer at a time as
+        # room frees up, and a gold customer let in still goes ahead
+        batch = asyncio.create_task(intake.enqueue_many(['Jeremy', 'Felica', 'Dilly'], 2))
+        await asyncio.sleep(0)
+        assert str(intake) == "['Leety', 'Carcinogen']"
+        assert await intake.dequeue_many(3) == ['Leety', 'Jeremy', 'Carcinogen']
+        await batch
+        assert await intake.dequeue_many(3) == ['Felica', 'Dilly']
+
+    asyncio.run(run_order_intake())
+    # Async queues are not Queues, so nothing expecting dequeue() to
+    # return a value can be handed one by mistake
+    assert not isinstance(AsyncQueue(), Queue) and not isinstance(AsyncTieredQueue(), TieredQueue)